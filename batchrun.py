@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import argparse
+import importlib.util
+import json
+import os
+import numpy as np
+from time import perf_counter
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # engines share files with their viewers
+import gameoflife_c
+import mazegen
+from hashlife import HashLife
+from rules import LIFE, MAZE
+from rle import loadRLE
+from snapshot import saveSnapshot, loadSnapshot
+from deltas import DeltaWriter
+from recorder import Recorder
+
+'''
+Headless batch runner, runs any of the engines as fast as they go, with no window
+and no frame cap. Loads an RLE pattern (or makes a random soup), runs N generations,
+then writes the final state and stats (population, bounding box, time per generation).
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+SOUP = 256  # random soup side length, unless --soup says otherwise
+DELTACHUNK = 64  # generations stepped between delta stream writes, bounds what's held in memory
+HERE = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location('life_infdict', os.path.join(HERE, 'life-infdict.py'))
+lifeinf = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(lifeinf)
+
+class GridRunner():  # fixed size torus engines, from gameoflife_c.py and mazegen.py
+    def __init__(self, engine, pattern, size, rule):
+        if max(pattern.shape) > size : raise ValueError(f'{pattern.shape[0]}x{pattern.shape[1]} pattern doesn\'t fit a {size}x{size} map, raise --size')
+        if engine == 'maze' : self.life = mazegen.LifeGrid((size, size), pattern.astype(np.int16), rule or MAZE)
+        else: self.life = gameoflife_c.ENGINES[engine]((size, size), pattern, rule or LIFE)
+        if engine != 'maze' : self.life.countNeighbors()  # maze counts inside runLife
+        self.engine, self.writer = engine, None
+
+    def watch(self):  # step() stops early once the grid settles or repeats
+        self.life.watchCycles()
+
+    def record(self, path, generation, rule, compress):  # what changed each generation gets written as the run goes
+        if self.engine == 'maze' : raise ValueError('delta streams need one of the gameoflife_c engines')
+        cells = self.state()[0]
+        self.writer = DeltaWriter(path, cells.shape, rule, generation, cells, compress)
+        self.life.watchDeltas(record=True)
+        self.generation = generation
+        return self.writer
+
+    def period(self):
+        return self.life.cycles.period if self.life.cycles else 0
+
+    def run(self, gens):  # returns generations actually run
+        if not self.writer : return self.life.step(gens)
+        done = 0
+        while done < gens:
+            chunk = min(DELTACHUNK, gens-done)
+            ran = self.life.step(chunk)
+            self.writer.writeAll(self.generation + done, self.life.takeDeltas())
+            done += ran
+            if ran < chunk : break  # stopped on a cycle
+        return done
+
+    def state(self):  # live cells, and the world coords of the array's corner
+        return np.asarray(self.life.grid, np.bool_), (0, 0)
+
+class SparseRunner():  # unbounded engines from life-infdict.py, B3/S23 only apart from chunks
+    def __init__(self, engine, pattern, size, rule):
+        cells = {(int(x), int(y)): 1 for x, y in np.argwhere(pattern)}
+        if engine == 'chunks':
+            self.life = lifeinf.LifeChunks(cells, rule or LIFE)
+            return
+        if rule and rule.replace(' ', '').upper() != LIFE : raise ValueError(f'{engine} engine only runs {LIFE}')
+        self.life = lifeinf.BACKENDS[engine](cells)
+
+    def watch(self):
+        raise ValueError('cycle detection needs one of the torus engines')
+
+    def record(self, path, generation, rule, compress):
+        raise ValueError('delta streams need one of the gameoflife_c engines')
+
+    def run(self, gens):
+        for _ in range(gens) : self.life.play_game()
+        return gens
+
+    def state(self):
+        xs, ys = self.life.coords()
+        if not len(xs) : return np.zeros((0, 0), np.bool_), (0, 0)
+        out = np.zeros((xs.max()-xs.min()+1, ys.max()-ys.min()+1), np.bool_)
+        out[xs-xs.min(), ys-ys.min()] = True
+        return out, (int(xs.min()), int(ys.min()))
+
+class HashRunner():
+    def __init__(self, engine, pattern, size, rule):
+        self.life = HashLife(pattern, rule=rule or LIFE)
+
+    def watch(self):
+        raise ValueError('cycle detection needs one of the torus engines')
+
+    def record(self, path, generation, rule, compress):
+        raise ValueError('delta streams need one of the gameoflife_c engines')
+
+    def run(self, gens):
+        self.life.advance(gens)
+        return gens
+
+    def state(self):
+        return self.life.toArray()
+
+RUNNERS = {'dense': GridRunner, 'bits': GridRunner, 'tiles': GridRunner, 'stripes': GridRunner, 'jit': GridRunner, 'maze': GridRunner,
+           'array': SparseRunner, 'dict': SparseRunner, 'chunks': SparseRunner, 'hashlife': HashRunner}
+
+def loadPattern(args):  # (cells, generation they're at, rule they were saved under or None)
+    if args.pattern and args.pattern.endswith('.snap'):
+        packed, header = loadSnapshot(args.pattern)
+        return gameoflife_c.unpackBits(packed, header['size'][1]), header['generation'], header.get('rule')
+    if args.pattern : return loadRLE(args.pattern)[0] > 0, 0, None
+    rng = np.random.default_rng(args.seed)
+    return rng.random((args.soup, args.soup)) < args.density, 0, None
+
+def windowFrame(cells, origin, window):  # cells placed into a fixed (x, y, w, h) window of the world, clipped at its edges
+    x, y, w, h = window
+    out = np.zeros((w, h), np.bool_)
+    ox, oy = origin[0]-x, origin[1]-y
+    sx, sy = max(-ox, 0), max(-oy, 0)
+    ex, ey = min(cells.shape[0], w-ox), min(cells.shape[1], h-oy)
+    if ex > sx and ey > sy : out[ox+sx:ox+ex, oy+sy:oy+ey] = cells[sx:ex, sy:ey]
+    return out
+
+def runBatch(args):
+    pattern, first, saved = loadPattern(args)
+    rule = args.rule or saved  # snapshots resume under their own rule, unless -r says otherwise
+    runner = RUNNERS[args.engine](args.engine, pattern, args.size, rule)
+    if args.stop_on_cycle : runner.watch()
+    writer = runner.record(args.deltas, first, rule or LIFE, args.compress == 'zlib') if args.deltas else None
+    recorder = Recorder(args.record, fps=args.fps, xy=True) if args.record else None
+    start = perf_counter()
+    if recorder:  # a frame of the whole state every so many generations
+        cells, (ox, oy) = runner.state()
+        m = 0 if isinstance(runner, GridRunner) else args.margin  # unbounded engines keep to the starting area
+        window = (ox-m, oy-m, cells.shape[0]+2*m, cells.shape[1]+2*m)
+        recorder.add(windowFrame(cells, (ox, oy), window))
+        gens = 0
+        while gens < args.gens:
+            chunk = min(args.every, args.gens - gens)
+            ran = runner.run(chunk)
+            gens += ran
+            recorder.add(windowFrame(*runner.state(), window))
+            if ran < chunk : break  # stopped on a cycle
+        recorder.close()
+    else: gens = runner.run(args.gens)
+    elapsed = perf_counter() - start
+    if writer : writer.close()
+    cells, (ox, oy) = runner.state()
+    live = np.argwhere(cells)
+    stats = {'engine': args.engine, 'pattern': args.pattern or f'random {args.soup}x{args.soup} @ {args.density}',
+             'seed': None if args.pattern else args.seed, 'generations': gens,
+             'period': runner.period() if args.stop_on_cycle else None,
+             'population': int(len(live)), 'seconds': elapsed,
+             'ms_per_generation': 1000 * elapsed / max(gens, 1),
+             'bbox': None if not len(live) else [int(ox+live[:, 0].min()), int(oy+live[:, 1].min()),
+                                                 int(ox+live[:, 0].max()), int(oy+live[:, 1].max())]}
+    if args.out : np.save(args.out, cells)
+    if args.snapshot:  # torus engines save the whole map, the others their live area
+        life = getattr(runner, 'life', None)
+        if hasattr(life, 'packedGrid') : packed = life.packedGrid()
+        else: packed = gameoflife_c.packBits(cells, -(-cells.shape[1] // 64))
+        saveSnapshot(args.snapshot, packed, cells.shape[1], rule or (MAZE if args.engine == 'maze' else LIFE), first + gens, args.compress)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a cellular automaton headless, as fast as the engine allows.')
+    parser.add_argument('pattern', nargs='?', help='RLE or .snap file to load, random soup if left out')
+    parser.add_argument('-e', '--engine', default='bits', choices=sorted(RUNNERS))
+    parser.add_argument('-g', '--gens', type=int, default=1000, help='generations to run')
+    parser.add_argument('-r', '--rule', help='rule string, defaults to the engine\'s usual rule')
+    parser.add_argument('--size', type=int, default=gameoflife_c.MAPSIZE, help='map size for the torus engines')
+    parser.add_argument('--soup', type=int, help=f'random soup side length, {SOUP} or the map size if smaller')
+    parser.add_argument('--density', type=float, default=0.35, help='random soup fill ratio')
+    parser.add_argument('--seed', type=int, default=None, help='random soup seed')
+    parser.add_argument('-c', '--stop-on-cycle', action='store_true',
+                        help='stop early once the grid settles or repeats (torus engines only)')
+    parser.add_argument('-o', '--out', help='save the final live area as a .npy bool array')
+    parser.add_argument('--snapshot', help='save the final state as a .snap file, to resume from later')
+    parser.add_argument('--compress', choices=['zlib', 'zstd'], help='snapshot compression, zlib also packs delta streams')
+    parser.add_argument('--deltas', help='record the cells born and died each generation to this file (gameoflife_c engines)')
+    parser.add_argument('--record', help='record frames, to a .gif, PNGs like frames/life_{:06d}.png, or a folder')
+    parser.add_argument('--every', type=int, default=1, help='generations between recorded frames')
+    parser.add_argument('--fps', type=int, default=30, help='recorded GIF speed')
+    parser.add_argument('--margin', type=int, default=64,
+                        help='cells recorded around the starting live area, for the unbounded engines')
+    parser.add_argument('-s', '--stats', help='also write the stats JSON to this file')
+    args = parser.parse_args()
+    torus = RUNNERS[args.engine] is GridRunner
+    if args.stop_on_cycle and not torus : parser.error(f'-c needs one of the torus engines, {args.engine} can\'t detect cycles')
+    if args.soup is None : args.soup = min(SOUP, args.size) if torus else SOUP  # shrinks to fit small maps
+    elif torus and not args.pattern and args.soup > args.size:
+        parser.error(f'--soup {args.soup} doesn\'t fit a --size {args.size} map')
+    stats = runBatch(args)
+    print(json.dumps(stats, indent=2))
+    if args.stats:
+        with open(args.stats, 'w') as file : json.dump(stats, file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import platform
+import multiprocessing as mp
+import tracemalloc
+import numpy as np
+from time import perf_counter, strftime
+try:
+    import resource  # peak RSS, not on Windows
+except ImportError:
+    resource = None
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import gameoflife_c
+import mazegen
+import mapgen
+import smoothlife
+from batchrun import lifeinf
+from rle import loadRLE
+from rules import CAVE2
+from stripes import THREADS
+
+'''
+Headless benchmark harness for all the simulations. Each case (target, size, pattern)
+runs in its own fresh process, so peak RSS belongs to that case alone. Reports
+generations and cells per second, peak RSS, and bytes NumPy allocates per step, into
+a JSON file that a later run can be compared against, to catch regressions.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+SIZES = [256, 1024]
+GENS = 100          # generations timed per case, unless MAXTIME runs out first
+MAXTIME = 10.0      # seconds per case
+TRACED = 3          # generations stepped under tracemalloc, apart from the timing
+THRESHOLD = 0.10    # slowdown that counts as a regression when comparing
+
+def lifeTarget(engine):  # gameoflife_c.py engines, steps with runLife and keeps neighbors current
+    def build(size, pattern):
+        life = gameoflife_c.ENGINES[engine]((size, size), pattern)
+        life.countNeighbors()
+        return life.step, size*size
+    return build
+
+def mazeTarget(engine, **options):  # options like threads=THREADS, so maze-stripes matches life-stripes
+    def build(size, pattern):
+        life = engine((size, size), pattern.astype(np.int16), **options)
+        return life.runLife, size*size
+    return build
+
+def sparseTarget(backend):  # life-infdict.py, work follows population rather than area
+    def build(size, pattern):
+        cells = {(int(x), int(y)): 1 for x, y in np.argwhere(pattern)}
+        life = lifeinf.BACKENDS[backend](cells)
+        return life.play_game, max(len(cells), 1)
+    return build
+
+def mapgenTarget(fused, rule=mapgen.rule):  # makes its own random map, patterns don't apply
+    def build(size, pattern):
+        return mapgen.CellularAutomata((size, size), fused, rule).iterate, size*size
+    return build
+
+def smoothTarget(size, pattern):
+    return smoothlife.SmoothLife((size, size)).step, size*size
+
+# name -> (builder, whether it takes patterns)
+TARGETS = {'life-dense': (lifeTarget('dense'), True), 'life-bits': (lifeTarget('bits'), True),
+           'life-tiles': (lifeTarget('tiles'), True), 'life-stripes': (lifeTarget('stripes'), True),
+           'life-jit': (lifeTarget('jit'), True), 'maze': (mazeTarget(mazegen.LifeGrid), True),
+           'maze-stripes': (mazeTarget(mazegen.StripedLifeGrid, threads=THREADS), True), 'maze-jit': (mazeTarget(mazegen.JitLifeGrid), True),
+           'infdict-array': (sparseTarget('array'), True), 'infdict-dict': (sparseTarget('dict'), True),
+           'infdict-chunks': (sparseTarget('chunks'), True),
+           'mapgen': (mapgenTarget(False), False), 'mapgen-jit': (mapgenTarget(True), False),
+           'mapgen-r2': (mapgenTarget(False, CAVE2), False), 'mapgen-r5': (mapgenTarget(False, 'R5 >60'), False), 'smoothlife': (smoothTarget, False)}
+
+def loadCase(target, size, pattern, seed):
+    if pattern : cells = loadRLE(pattern)[0] > 0
+    else: cells = np.random.default_rng(seed).random((size, size)) < 0.35
+    np.random.seed(seed)  # mapgen and smoothlife seed themselves from the global generator
+    return TARGETS[target][0](size, cells)
+
+def runCase(case):  # runs in a child process, returns one result row
+    target, size, pattern, gens, maxTime, seed = case
+    step, cells = loadCase(target, size, pattern, seed)
+    step()  # warm up caches, FFT plans and such
+    done, start = 0, perf_counter()
+    while done < gens and perf_counter() - start < maxTime:
+        step()
+        done += 1
+    elapsed = perf_counter() - start
+    tracemalloc.start()  # NumPy reports its buffers to tracemalloc too
+    peaks = []
+    for _ in range(TRACED):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        step()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    rss = None
+    if resource:  # kilobytes on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if platform.system() == 'Darwin' else 2**10)
+    return {'target': target, 'size': size, 'pattern': pattern or 'random', 'generations': done,
+            'seconds': elapsed, 'gens_per_sec': done / elapsed, 'cells_per_sec': cells * done / elapsed,
+            'peak_rss_mb': rss, 'alloc_mb_per_step': float(np.mean(peaks)) / 2**20}
+
+def makeCases(args):
+    shapes = {pattern: loadRLE(pattern)[0].shape for pattern in args.patterns or []}
+    cases = []
+    for target in args.targets:
+        patterns = args.patterns if args.patterns and TARGETS[target][1] else [None]
+        for size in args.sizes:
+            for pattern in patterns:
+                if pattern and max(shapes[pattern]) > size:
+                    print(f'skipping {target} {size}, {pattern} doesn\'t fit')
+                    continue
+                cases.append((target, size, pattern, args.gens, args.max_time, args.seed))
+    return cases
+
+def caseKey(row):
+    return row['target'], row['size'], row['pattern']
+
+def compare(rows, old, threshold):  # prints speed ratios against an older run, returns the regressions
+    before = {caseKey(row): row for row in old['results']}
+    slower = []
+    for row in rows:
+        prev = before.get(caseKey(row))
+        if not prev : continue
+        ratio = row['gens_per_sec'] / prev['gens_per_sec']
+        flag = '  REGRESSION' if ratio < 1 - threshold else ''
+        print(f"{row['target']:>14} {row['size']:>6} {os.path.basename(row['pattern']):>20}  "
+              f"{prev['gens_per_sec']:10.2f} -> {row['gens_per_sec']:10.2f} gen/s  x{ratio:.2f}{flag}")
+        if flag : slower.append(row)
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the simulations headless, one fresh process per case.')
+    parser.add_argument('-t', '--targets', nargs='+', default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES, help='grid side lengths, soup size for infdict')
+    parser.add_argument('-p', '--patterns', nargs='*', help='RLE files to run, random soups if left out')
+    parser.add_argument('-g', '--gens', type=int, default=GENS, help='generations timed per case')
+    parser.add_argument('--max-time', type=float, default=MAXTIME, help='seconds per case, before giving up on gens')
+    parser.add_argument('--seed', type=int, default=1, help='random soup seed')
+    parser.add_argument('-o', '--out', default='benchmark.json', help='where to write the results')
+    parser.add_argument('-c', '--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='slowdown ratio flagged as regression')
+    args = parser.parse_args()
+    rows = []
+    with mp.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for row in pool.imap(runCase, makeCases(args), chunksize=1):
+            print(f"{row['target']:>14} {row['size']:>6} {os.path.basename(row['pattern']):>20}  "
+                  f"{row['gens_per_sec']:10.2f} gen/s  {row['cells_per_sec']:12.4g} cells/s  "
+                  f"{row['peak_rss_mb'] or 0:8.1f} MB  {row['alloc_mb_per_step']:8.2f} MB/step", flush=True)
+            rows.append(row)
+    report = {'time': strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'numpy': np.__version__,
+              'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(), 'results': rows}
+    with open(args.out, 'w') as file : json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file : old = json.load(file)
+        if compare(rows, old, args.threshold) : raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import numpy as np
+from collections import deque
+
+'''
+Stagnation and cycle detection, shared by the simulations. Keeps a 64 bit hash of the
+grid, packed 64 cells to a word, where each word is mixed with its own random key through
+a splitmix64 finalizer and the results summed, so every cell position counts independently.
+It can be rebuilt from the packed grid, or updated by rehashing only the words that changed.
+A small table of recent hashes then spots still lifes (period 1) and oscillators.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+HISTORY = 64  # longest period that gets noticed
+MASK = (1 << 64) - 1
+MIX = (np.uint64(30), np.uint64(0xBF58476D1CE4E5B9), np.uint64(27), np.uint64(0x94D049BB133111EB), np.uint64(31))
+
+class CycleDetector():
+    def __init__(self, cells, history=HISTORY, seed=0x5EED):
+        self.words = -(-cells // 64)
+        self.keys = np.random.default_rng(seed).integers(0, 2**64, self.words, np.uint64, endpoint=False)  # one per word
+        self.packed = None  # words of the last full gridHash, kept so updateCells can rehash just what changed
+        self.history = history
+        self.reset()
+
+    def reset(self):
+        self.hash = 0
+        self.generation, self.period = 0, 0
+        self.seen = {}  # hash -> latest generation it was seen at
+        self.order = deque()  # (hash, generation), oldest first
+
+    def gridHash(self, grid):  # any 0/1 array with the detector's cell count
+        bits = np.packbits(np.ravel(grid), bitorder='little')
+        padded = np.zeros(self.words * 8, np.uint8)
+        padded[:len(bits)] = bits
+        self.packed = padded.view('<u8')
+        return self.wordsHash(self.packed)
+
+    def wordsHash(self, words, index=slice(None)):  # cells already packed 64 to a word, lowest bit first
+        return int(mixWords(np.asarray(words, np.uint64).ravel() ^ self.keys[index]).sum(dtype=np.uint64))  # wraps mod 2**64
+
+    def update(self, grid):  # full rehash, returns the period found, or 0
+        self.hash = self.gridHash(grid)
+        return self.check()
+
+    def updateWords(self, words):
+        self.hash, self.packed = self.wordsHash(words), None
+        return self.check()
+
+    def updateCells(self, born, died):  # incremental after update(), from flat indices of cells that changed
+        cells = np.concatenate((born, died)).astype(np.int64)
+        index = np.unique(cells >> 6)
+        old = self.packed[index]
+        np.bitwise_xor.at(self.packed, cells >> 6, np.left_shift(np.uint64(1), (cells & 63).astype(np.uint64)))
+        self.hash = (self.hash + self.wordsHash(self.packed[index], index) - self.wordsHash(old, index)) & MASK
+        return self.check()
+
+    def check(self):
+        h = self.hash
+        prior = self.seen.get(h)
+        self.period = self.generation - prior if prior is not None else 0
+        self.seen[h] = self.generation
+        self.order.append((h, self.generation))
+        if len(self.order) > self.history:
+            old, gen = self.order.popleft()
+            if self.seen.get(old) == gen : del self.seen[old]
+        self.generation += 1
+        return self.period
+
+def mixWords(x):  # splitmix64 finalizer, so a flipped bit anywhere changes the whole word's hash
+    a, b, c, d, e = MIX
+    x = x ^ (x >> a)
+    x *= b
+    x ^= x >> c
+    x *= d
+    x ^= x >> e
+    return x
+
+def checkGliders(sizes=(64, 128, 256), gens=500):  # a lone glider never repeats on a torus, so it must never report a period
+    import gameoflife_c
+    glider = np.array([[0, 1, 0], [0, 0, 1], [1, 1, 1]], np.bool_)
+    for engine in ('dense', 'bits', 'tiles'):
+        for size in sizes:
+            for spot in [(0, 0), (10, 61), (size-2, size-3), (size//2, 63)]:
+                pattern = np.zeros((size, size), np.bool_)
+                pattern[:3, :3] = glider
+                life = gameoflife_c.ENGINES[engine]((size, size), np.roll(pattern, spot, (0, 1)))
+                life.countNeighbors()
+                life.watchCycles()
+                for gen in range(gens):
+                    if life.step() and life.cycles.period : raise AssertionError(f'{engine} {size}x{size} glider at {spot} got period {life.cycles.period} at {gen}')
+    print('ok, no false cycles')
+
+if __name__ == '__main__':
+    checkGliders()
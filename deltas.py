@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import json
+import zlib
+import numpy as np
+
+'''
+Change streams for recording or sending runs. A short JSON header is followed by one
+record per generation, holding only the cells born and the cells that died, as x, y
+pairs, so a mostly still map costs a few bytes a generation instead of a whole frame.
+The first record can carry the starting cells, so a stream replays on its own.
+Works on files, pipes and sockets alike, since it only ever writes or reads in order.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+MAGIC = b'LIFEDLTA'
+VERSION = 1
+RECORD = np.dtype([('generation', '<i8'), ('born', '<u4'), ('died', '<u4'), ('bytes', '<u4')])
+
+class DeltaWriter():
+    def __init__(self, file, size, rule, generation=0, grid=None, compress=False):  # file is a path or binary stream
+        self.file = open(file, 'wb') if isinstance(file, str) else file
+        self.owned = isinstance(file, str)
+        self.coords = np.dtype('<u2' if max(size) <= 1 << 16 else '<u4')  # smallest type that fits the map
+        self.compress = compress
+        header = json.dumps({'version': VERSION, 'size': list(size), 'rule': rule,
+                             'coords': self.coords.str, 'compress': compress}).encode()
+        self.file.write(MAGIC + np.uint32(len(header)).tobytes() + header)
+        if grid is not None : self.write(generation, np.argwhere(grid), np.zeros((0, 2), np.int32))
+
+    def write(self, generation, born, died):  # born and died are (n, 2) arrays of x, y
+        body = np.asarray(born, self.coords).tobytes() + np.asarray(died, self.coords).tobytes()
+        if self.compress : body = zlib.compress(body, 1)
+        self.file.write(np.array((generation, len(born), len(died), len(body)), RECORD).tobytes() + body)
+
+    def writeAll(self, generation, deltas):  # an engine's takeDeltas(), generation is where it was before them
+        for gen, (born, died) in enumerate(deltas, generation+1) : self.write(gen, born, died)
+
+    def close(self):
+        if self.owned : self.file.close()
+        else: self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def readDeltas(file):  # header dict, and a generator of (generation, born, died)
+    stream = open(file, 'rb') if isinstance(file, str) else file
+    if stream.read(len(MAGIC)) != MAGIC : raise ValueError(f'{file} is not a delta stream')
+    header = json.loads(stream.read(int(np.frombuffer(stream.read(4), np.uint32)[0])))
+    if header['version'] > VERSION : raise ValueError(f'{file} needs a newer delta stream version')
+    coords = np.dtype(header['coords'])
+
+    def records():
+        try:
+            while True:
+                raw = stream.read(RECORD.itemsize)
+                if len(raw) < RECORD.itemsize : return
+                record = np.frombuffer(raw, RECORD)[0]
+                body = stream.read(int(record['bytes']))
+                if header['compress'] : body = zlib.decompress(body)
+                cells = np.frombuffer(body, coords).reshape(-1, 2).astype(np.intp)
+                yield int(record['generation']), cells[:record['born']], cells[record['born']:]
+        finally:
+            if isinstance(file, str) : stream.close()
+    return header, records()
+
+def replay(file):  # yields (generation, grid) after each record, the grid gets updated in place
+    header, records = readDeltas(file)
+    grid = np.zeros(header['size'], np.bool_)
+    for generation, born, died in records:
+        grid[born[:, 0], born[:, 1]] = True
+        grid[died[:, 0], died[:, 1]] = False
+        yield generation, grid
@@ -1,7 +1,18 @@
 #!/usr/bin/env python3
 import pygame as pg
 import numpy as np
-import re
+from contextlib import nullcontext
+from time import perf_counter
+from rules import compileRule, applyRule, ruleString
+from simthread import SimThread
+from render import ViewRenderer, crop, dirtyRects
+from rle import loadRLE
+from snapshot import saveSnapshot, openSnapshot
+from recorder import Recorder
+from cycles import CycleDetector, HISTORY
+from profiler import StageTimer, OFF
+from stripes import StripePool, THREADS
+from jitkernels import stepGrid, countGrid
 
 '''
 A Conway's Game of Life simulation, using NumPy, and with RLE support!
@@ -19,15 +30,35 @@ FLLSCRN = False         # True for fullscreen, False for window
 FPS = 60                # overall target framerate/limit
 VSYNC = True            # limit frame rate to refresh rate
 SHOWFPS = True          # show framerate debug
+RULE = 'B3/S23'         # any outer-totalistic rule string, like B36/S23 for HighLife
+GENSTEPS = 1            # generations per frame, PageUp/PageDown doubles or halves it, up to 1024
+SIMBUDGET = 0.75        # share of each frame spent simulating, when filling the frame budget (B key)
+THREADED = False        # step the simulation on a worker thread, so drawing never waits for it
+ENGINE = 'dense'        # 'dense' for np.roll counting, 'bits' bit-packed, 'tiles' active tiles only, 'stripes' multi-core dense,
+                        # 'jit' one fused pass per generation (compiled with numba when installed)
+ONCYCLE = None          # when the grid settles or repeats: None ignores it, 'stop' pauses, 'reseed' starts a new soup
+SOUPSIZE = 256          # side length of the random soup used when reseeding
+SNAPFILE = 'life.snap'  # F5 saves the map here, F9 restores it
+SNAPZIP = None          # snapshot compression, None (fastest, memory mappable), 'zlib' or 'zstd'
+RECORDTO = 'frames/life_{:06d}.png'  # F7 starts and stops recording the whole map here, or to a .gif
+PROFILE = False         # start with the stage timing overlay on, F3 toggles it
+PROFILECSV = None       # file to log per-frame stage times to while profiling, like 'profile.csv'
+DIRTYRECTS = True       # only repaint the parts of the view that changed (not while THREADED)
+DIRTYTILE = 16          # cells per side of the tiles changes get tracked in
+STAGES = ['tick', 'events', 'runLife', 'countNeighbors', 'view', 'colors', 'blit', 'scale', 'display']
 
 class LifeGrid():
-    def __init__(self, maxSize, pattern):
+    def __init__(self, maxSize, pattern, rule=RULE):
         self.size = maxSize
-        self.grid = np.zeros(self.size, np.bool_)
-        cen_x = (self.size[0]//2) - (pattern.shape[0]//2)
-        cen_y = (self.size[1]//2) - (pattern.shape[1]//2)
-        self.grid[cen_x:cen_x+pattern.shape[0], cen_y:cen_y+pattern.shape[1]] = pattern
+        self.lut = compileRule(rule)
+        self.grid = centerPattern(self.size, pattern)
         self.neighbors = np.zeros(self.size, np.uint8)
+        self.cycles = None
+        self.dirty, self.deltas = None, None
+        self.timer = OFF
+
+    def setRule(self, rule):  # switches rules mid run, like for a snapshot saved under another one
+        self.lut = compileRule(rule)
 
     def countNeighbors(self):
         self.neighbors[:] = 0
@@ -38,53 +69,372 @@ class LifeGrid():
                     np.add(self.neighbors, shifted, out=self.neighbors)
 
     def runLife(self):
-        alive = self.grid > 0
-        twos = self.neighbors == 2
-        threes = self.neighbors == 3
-        self.grid[:] = 0  # zero out the current grid
-        # lots of unnecessary copying here, but it's so elegant - Ghast's wizardry
-        self.grid[(alive & (twos | threes)) | ((~alive) & threes)] = 1
+        old = self.grid
+        self.grid = applyRule(self.lut, self.grid, self.neighbors)
+        if self.dirty is not None : self.noteChanges(old, self.grid)
+
+    def step(self, gens=1):  # several generations at once, leaves neighbors ready for drawing
+        done = 0
+        while done < gens:
+            with self.timer.stage('runLife') : self.runLife()
+            with self.timer.stage('countNeighbors') : self.countNeighbors()
+            done += 1
+            if self.cycles and self.trackCycles() : break  # stops early once the grid repeats
+        return done
+
+    def load(self, pattern):  # replaces the whole map, like for a reseed
+        self.grid = centerPattern(self.size, pattern)
+        self.countNeighbors()
+
+    def packedGrid(self):  # cells packed 64 to a word along y, the layout snapshots use
+        return packBits(self.grid, -(-self.size[1] // 64))
+
+    def loadPacked(self, packed):
+        self.load(unpackBits(packed, self.size[1]))
+
+    def watchCycles(self, history=HISTORY):  # (re)starts cycle detection from the current grid
+        if self.cycles is None : self.cycles = CycleDetector(self.grid.size, history)
+        self.cycles.reset()
+        self.trackCycles()
+
+    def trackCycles(self):  # returns the period, or 0 while the grid hasn't repeated
+        return self.cycles.update(self.grid)
+
+    def watchDeltas(self, record=False):  # starts marking changed tiles, and keeping born/died cells if recording
+        self.dirty = np.ones((-(-self.size[0] // DIRTYTILE), -(-self.size[1] // DIRTYTILE)), np.bool_)
+        self.deltas = [] if record else None
+
+    def takeDirty(self):  # tiles changed since the last call, cleared after
+        dirty, self.dirty = self.dirty, np.zeros_like(self.dirty)
+        return dirty
+
+    def takeDeltas(self):  # [(born, died), ...] per generation since the last call, each an (n, 2) array of x, y
+        deltas, self.deltas = self.deltas, []
+        return deltas
+
+    def noteChanges(self, old, new):  # from the grids before and after a step
+        xs, ys = np.nonzero(old != new)
+        self.addDelta(xs, ys, new[xs, ys])
+
+    def addDelta(self, xs, ys, alive):  # cells one generation flipped, and what they flipped to
+        self.markDirty(xs, ys)
+        if self.deltas is not None:
+            cells = np.column_stack((xs, ys)).astype(np.int32)
+            self.deltas.append((cells[alive], cells[~alive]))
+
+    def markDirty(self, xs, ys):
+        T = DIRTYTILE
+        for dx in [-1, 0, 1]:  # neighbor counts change around them too
+            for dy in [-1, 0, 1]:
+                self.dirty[((xs+dx) % self.size[0]) // T, ((ys+dy) % self.size[1]) // T] = True
+
+    def view(self, x, y, w, h, counts=True):  # visible part of the grid, and its neighbors if wanted
+        return crop(self.grid, x, y, w, h), crop(self.neighbors, x, y, w, h) if counts else None
 
     def poke(self, pos, cSize, off_x, off_y, status):
         spot = (pos[0]//cSize)+off_x, (pos[1]//cSize)+off_y  # edge rounding weird
         if spot[0]==self.size[0] : spot = 0,spot[1]
         if spot[1]==self.size[1] : spot = spot[0],0
+        self.setCell(spot, status)
+        if self.dirty is not None : self.markDirty(np.array([spot[0]]), np.array([spot[1]]))  # edits aren't generations
+
+    def setCell(self, spot, status):
         self.grid[spot] = status
         self.countNeighbors()
+        if self.cycles : self.watchCycles(self.cycles.history)  # edits break the cycle
+
+class BitLifeGrid(LifeGrid):
+    # Same rules, but columns are packed 64 cells per uint64 word, and neighbor
+    # sums are done with bitwise adders, so each step touches 1/64th the memory.
+    def __init__(self, maxSize, pattern, rule=RULE):
+        self.size = maxSize
+        self.setRule(rule)
+        self.words = -(-self.size[1] // 64)  # words per row, last may be partial
+        self.tail = np.uint64(self.size[1] - (self.words-1)*64)  # used bits in last word
+        self.tailmask = np.uint64((1 << int(self.tail)) - 1)
+        self.packed = packBits(centerPattern(self.size, pattern), self.words)
+        self._grid, self._neighbors = None, None
+        self.cycles = None
+        self.dirty, self.deltas = None, None
+        self.timer = OFF
+
+    def setRule(self, rule):
+        self.lut = compileRule(rule)
+        born, stay = set(np.nonzero(self.lut[0])[0]), set(np.nonzero(self.lut[1])[0])
+        self.counts = (born & stay, born - stay, stay - born)  # any state, dead only, alive only
+
+    @property
+    def grid(self):  # unpacked bool view, rebuilt only when something changed
+        if self._grid is None : self._grid = unpackBits(self.packed, self.size[1])
+        return self._grid
+
+    @property
+    def neighbors(self):  # only needed for color mode, so counted on demand
+        if self._neighbors is None:
+            bits = self.countBits(self.packed)
+            self._neighbors = np.zeros(self.size, np.uint8)
+            for weight, plane in zip((1, 2, 4, 8), bits):
+                self._neighbors += unpackBits(plane, self.size[1]) * np.uint8(weight)
+        return self._neighbors
+
+    def view(self, x, y, w, h, counts=True):  # only unpacks and counts the visible rows
+        rows = np.arange(x-1, min(x+w, self.size[0])+1) % self.size[0]
+        part = self.packed[rows]
+        grid = unpackBits(part[1:-1], self.size[1])[:, y:y+h]
+        if not counts : return grid, None
+        neighbors = np.zeros(grid.shape, np.uint8)
+        for weight, plane in zip((1, 2, 4, 8), self.countBits(part)):
+            neighbors += unpackBits(plane[1:-1], self.size[1])[:, y:y+h] * np.uint8(weight)
+        return grid, neighbors
+
+    def load(self, pattern):
+        self.packed = packBits(centerPattern(self.size, pattern), self.words)
+        self._grid, self._neighbors = None, None
+
+    def packedGrid(self):
+        return self.packed
+
+    def loadPacked(self, packed):  # already in the engine's layout, so no unpacking
+        self.packed = np.array(packed, np.uint64)
+        self._grid, self._neighbors = None, None
+
+    def watchCycles(self, history=HISTORY):  # hashes the packed words directly, no unpacking
+        if self.cycles is None : self.cycles = CycleDetector(self.packed.size*64, history)
+        self.cycles.reset()
+        self.trackCycles()
+
+    def trackCycles(self):
+        return self.cycles.updateWords(self.packed)
+
+    def fromPrev(self, p):  # bit y holds cell y-1, wrapping around the torus
+        out = p << np.uint64(1)
+        out[:, 1:] |= p[:, :-1] >> np.uint64(63)
+        out[:, 0] |= (p[:, -1] >> (self.tail - np.uint64(1))) & np.uint64(1)
+        return out
+
+    def fromNext(self, p):  # bit y holds cell y+1, wrapping around the torus
+        out = p >> np.uint64(1)
+        out[:, :-1] |= p[:, 1:] << np.uint64(63)
+        out[:, -1] |= (p[:, 0] & np.uint64(1)) << (self.tail - np.uint64(1))
+        return out
+
+    def countBits(self, p):
+        # returns the 4 bit-planes (1s, 2s, 4s, 8s) of every cell's neighbor count
+        left, right = self.fromPrev(p), self.fromNext(p)
+        side0, side1 = left ^ right, left & right  # left + right
+        full0, full1 = side0 ^ p, side1 | (side0 & p)  # left + center + right
+        up0, up1 = np.roll(full0, 1, 0), np.roll(full1, 1, 0)
+        down0, down1 = np.roll(full0, -1, 0), np.roll(full1, -1, 0)
+        t = up0 ^ side0
+        s0, c0 = t ^ down0, (up0 & side0) | (t & down0)
+        t = up1 ^ side1
+        a, c1 = t ^ down1, (up1 & side1) | (t & down1)
+        s1, c2 = a ^ c0, a & c0
+        return s0, s1, c1 ^ c2, c1 & c2
+
+    def matches(self, counts, bits, flipped):  # words flagging cells whose neighbor count is in counts
+        out = np.zeros_like(self.packed)
+        for n in counts:
+            exact = bits[0] if n & 1 else flipped[0]
+            for i in [1, 2, 3] : exact = exact & (bits[i] if n >> i & 1 else flipped[i])
+            out |= exact
+        return out
+
+    def countNeighbors(self):
+        self._neighbors = None
+
+    def runLife(self):
+        bits = self.countBits(self.packed)
+        flipped = [~b for b in bits]
+        anyState, deadOnly, aliveOnly = (self.matches(c, bits, flipped) for c in self.counts)
+        new = anyState | (deadOnly & ~self.packed) | (aliveOnly & self.packed)
+        new[:, -1] &= self.tailmask
+        if self.dirty is not None : self.notePacked(self.packed, new)
+        self.packed = new
+        self._grid, self._neighbors = None, None
+
+    def notePacked(self, old, new):  # only words that changed get unpacked
+        rows, words = np.nonzero(old ^ new)
+        flips = np.unpackbits((old[rows, words] ^ new[rows, words]).astype('<u8').view(np.uint8).reshape(-1, 8),
+                              axis=1, bitorder='little')
+        i, bit = np.nonzero(flips)
+        ys = words[i]*64 + bit
+        alive = (new[rows[i], words[i]] >> bit.astype(np.uint64)) & np.uint64(1)
+        self.addDelta(rows[i], ys, alive.astype(np.bool_))
+
+    def setCell(self, spot, status):
+        word, bit = divmod(spot[1], 64)
+        if status : self.packed[spot[0], word] |= np.uint64(1 << bit)
+        else: self.packed[spot[0], word] &= ~np.uint64(1 << bit)
+        self._grid, self._neighbors = None, None
+        if self.cycles : self.watchCycles(self.cycles.history)
+
+class TiledLifeGrid(LifeGrid):
+    # Only steps the tiles that changed last generation, plus the ones bordering
+    # them, so cost follows pattern activity instead of map area. Wraps like np.roll.
+    TILE = 64    # tile edge length, in cells
+    BATCH = 256  # tiles gathered per numpy pass, bounds the temporary arrays
 
-def readRLE(contents):
-    data = ''
-    dline = len(contents)
-
-    for num, line in enumerate(contents):
-        if line.startswith('x'):
-            x,y = [int(s) for s in re.findall(r'\d+',line)][:2]
-            dline = num+1
-        if num >= dline : data += line
-
-    pattern = np.zeros((x,y), np.int16)
-    splitdata = [s for s in re.split("([0-9]*[^0-9])", data) if s != ""]
-
-    cx, cy = 0, 0
-    for sd in splitdata:
-        if sd[0].isdigit():
-            for c in range(int(sd[:-1])):
-                if sd[-1] == 'b' : pattern[cx+c,cy] = 0
-                elif sd[-1] == 'o' : pattern[cx+c,cy] = 1
-                elif sd[-1] == '$':
-                    cy += 1
-                    cx = 0
-            if sd[-1] == 'b' or sd[-1] == 'o' : cx += int(sd[:-1])
-        elif sd == '!': return pattern
-        elif sd == '$':
-            cy += 1
-            cx = 0
-        elif sd == 'b':
-            pattern[cx,cy] = 0
-            cx += 1
-        elif sd == 'o':
-            pattern[cx,cy] = 1
-            cx += 1
+    def __init__(self, maxSize, pattern, rule=RULE):
+        super().__init__(maxSize, pattern, rule)
+        LifeGrid.countNeighbors(self)
+        self.tiles = (-(-self.size[0] // self.TILE), -(-self.size[1] // self.TILE))
+        self.active = np.ones(self.tiles, np.bool_)
+        self.stale = np.zeros(self.tiles, np.bool_)  # tiles whose neighbors need a recount
+        self.offsets = np.arange(-1, self.TILE+1)
+        self.changed = None  # (born, died) flat indices from the last step, while watching cycles
+
+    def blocks(self, mask):  # yields batches of tiles with a 1 cell halo, and where they go
+        T = self.TILE
+        tx, ty = np.nonzero(mask)
+        rows = (tx[:, None]*T + self.offsets) % self.size[0]
+        cols = (ty[:, None]*T + self.offsets) % self.size[1]
+        for b in range(0, len(tx), self.BATCH):
+            r, c = rows[b:b+self.BATCH], cols[b:b+self.BATCH]
+            block = self.grid[r[:, :, None], c[:, None, :]]
+            counts = np.zeros((len(block), T, T), np.uint8)
+            for dx in [0, 1, 2]:
+                for dy in [0, 1, 2]:
+                    if (dx, dy) != (1, 1) : counts += block[:, dx:dx+T, dy:dy+T]
+            yield tx[b:b+self.BATCH], ty[b:b+self.BATCH], (r[:, 1:-1, None], c[:, None, 1:-1]), block, counts
+
+    def countNeighbors(self):  # only recounts tiles that changed since the last count
+        for tx, ty, spots, block, counts in self.blocks(self.stale):
+            self.neighbors[spots] = counts
+        self.stale[:] = False
+
+    def step(self, gens=1):  # runLife counts for itself, so only the drawn generation needs neighbors
+        done = 0
+        while done < gens:
+            with self.timer.stage('runLife') : self.runLife()
+            done += 1
+            if self.cycles and self.trackCycles() : break
+        with self.timer.stage('countNeighbors') : self.countNeighbors()
+        return done
+
+    def setRule(self, rule):  # still tiles may not be still under the new rule
+        super().setRule(rule)
+        self.active[:] = True
+
+    def load(self, pattern):
+        self.grid = centerPattern(self.size, pattern)
+        self.active[:], self.stale[:] = True, True
+        self.countNeighbors()
+
+    def watchCycles(self, history=HISTORY):
+        self.changed = None  # the first hash covers the whole grid, later ones only what changed
+        super().watchCycles(history)
+
+    def trackCycles(self):
+        if self.changed is None : return super().trackCycles()
+        return self.cycles.updateCells(*self.changed)
+
+    def runLife(self):
+        results, hotx, hoty, flips, births = [], [], [], [], []
+        for tx, ty, spots, block, counts in self.blocks(self.active):  # read all before writing
+            old = block[:, 1:-1, 1:-1]
+            new = applyRule(self.lut, old, counts)
+            changed = (new != old).any(axis=(1, 2))
+            results.append((spots, new))
+            hotx.append(tx[changed])
+            hoty.append(ty[changed])
+            if self.cycles or self.dirty is not None:  # flat index of every flipped cell, so the hash updates with activity
+                b, i, j = np.nonzero(new != old)
+                flips.append(spots[0][b, i, 0]*self.size[1] + spots[1][b, 0, j])
+                births.append(new[b, i, j])
+        for spots, new in results:  # partial edge tiles may overlap, but agree on values
+            self.grid[spots] = new
+        self.active[:] = False
+        if hotx : self.markActive(np.concatenate(hotx), np.concatenate(hoty))
+        self.stale |= self.active
+        if self.cycles or self.dirty is not None:
+            flat, first = np.unique(np.concatenate(flips or [[]]).astype(np.int64), return_index=True)
+            born = np.concatenate(births or [[]]).astype(np.bool_)[first]  # overlapping cells counted once
+            self.changed = flat[born], flat[~born]
+            if self.dirty is not None : self.addDelta(*divmod(flat, self.size[1]), born)
+
+    def markActive(self, tx, ty):  # changed tiles and their 8 neighbors step next time
+        hot = np.zeros(self.tiles, np.bool_)
+        hot[tx, ty] = True
+        for dx in [-1, 0, 1]:
+            for dy in [-1, 0, 1]:
+                self.active |= np.roll(hot, (dx, dy), (0, 1))
+
+    def setCell(self, spot, status):
+        if self.grid[spot] == bool(status) : return
+        self.grid[spot] = status
+        for dx in [-1, 0, 1]:
+            for dy in [-1, 0, 1]:
+                if (dx, dy) != (0, 0):
+                    near = (spot[0]+dx) % self.size[0], (spot[1]+dy) % self.size[1]
+                    if status : self.neighbors[near] += 1
+                    else: self.neighbors[near] -= 1
+        self.markActive(spot[0] // self.TILE, spot[1] // self.TILE)
+        if self.cycles : self.watchCycles(self.cycles.history)
+
+class StripedLifeGrid(LifeGrid):
+    # Dense rules, but the map is stepped in horizontal stripes on a thread pool,
+    # each with a one-row halo, so large maps use every core. Wraps like np.roll.
+    def __init__(self, maxSize, pattern, rule=RULE, threads=THREADS):
+        super().__init__(maxSize, pattern, rule)
+        self.stripes = StripePool(self.size, threads)
+        self.next = np.zeros(self.size, np.bool_)
+
+    def countNeighbors(self):
+        self.stripes.count(self.grid, self.neighbors)
+
+    def runLife(self):  # counts for itself, neighbors end up one generation behind until counted
+        self.stripes.step(self.lut, self.grid, self.neighbors, self.next)
+        self.grid, self.next = self.next, self.grid
+        if self.dirty is not None : self.noteChanges(self.next, self.grid)
+
+    step = TiledLifeGrid.step  # only the drawn generation needs a recount
+
+class JitLifeGrid(LifeGrid):
+    # Counts neighbors and applies the rule in one pass per generation, in parallel,
+    # using the kernel from jitkernels.py, which falls back to NumPy without numba.
+    def __init__(self, maxSize, pattern, rule=RULE):
+        super().__init__(maxSize, pattern, rule)
+        self.next = np.zeros(self.size, np.bool_)
+
+    def countNeighbors(self):
+        countGrid(self.grid, self.neighbors)
+
+    def runLife(self):
+        stepGrid(self.grid, self.lut, self.next)
+        self.grid, self.next = self.next, self.grid
+        if self.dirty is not None : self.noteChanges(self.next, self.grid)
+
+    step = TiledLifeGrid.step
+
+ENGINES = {'dense': LifeGrid, 'bits': BitLifeGrid, 'tiles': TiledLifeGrid, 'stripes': StripedLifeGrid, 'jit': JitLifeGrid}
+
+def centerPattern(size, pattern):
+    grid = np.zeros(size, np.bool_)
+    cen_x = (size[0]//2) - (pattern.shape[0]//2)
+    cen_y = (size[1]//2) - (pattern.shape[1]//2)
+    grid[cen_x:cen_x+pattern.shape[0], cen_y:cen_y+pattern.shape[1]] = pattern
+    return grid
+
+def packBits(grid, words):  # bool (x,y) grid into (x,words) uint64, bit n of word w is y=w*64+n
+    padded = np.zeros((grid.shape[0], words*64), np.bool_)
+    padded[:, :grid.shape[1]] = grid
+    return np.packbits(padded, axis=1, bitorder='little').view('<u8').astype(np.uint64)
+
+def unpackBits(packed, height):
+    bytes8 = packed.astype('<u8').view(np.uint8)
+    return np.unpackbits(bytes8, axis=1, bitorder='little')[:, :height].view(np.bool_)
+
+def restore(life, path):  # loads a snapshot into the running engine, and its rule, returns its generation
+    packed, header = openSnapshot(path)
+    if header.get('rule') : life.setRule(header['rule'])
+    if packed.shape == (life.size[0], -(-life.size[1] // 64)) : life.loadPacked(packed)
+    else:  # other map size, centered like a pattern, and cropped around its center if it's bigger
+        cells = unpackBits(packed, header['size'][1])
+        x, y = (max(cells.shape[0]-life.size[0], 0)//2, max(cells.shape[1]-life.size[1], 0)//2)
+        life.load(cells[x:x+life.size[0], y:y+life.size[1]])
+    if life.cycles : life.watchCycles(life.cycles.history)
+    return header['generation']
 
 def main():
     pg.init()  # prepare window
@@ -105,32 +455,51 @@ def main():
     adjust_x, adjust_y = (full_w//2)-centerx, (full_h//2)-centery
 
     try:
-        with open(PATFILE) as file : contents = file.read().splitlines()
-        pattern = readRLE(contents)
+        pattern, _ = loadRLE(PATFILE)
     except:
         pattern = np.array([[0, 1, 1], [1, 1, 0], [0, 1, 0]])  # R-pentomino
 
-    life = LifeGrid((full_w,full_h), pattern)
+    life = ENGINES[ENGINE]((full_w,full_h), pattern)
     colors = np.array([0, 0x999999, 0x0000FF, 0x00FF00, 0xFFFF00, 0xFFA500, 0xFF6400, 0xFF0000, 0xFF00FF])
+    renderer = ViewRenderer(colors)
+    engineStages = ['runLife', 'countNeighbors']  # only timed unthreaded, the worker's steps would land in whatever frame was open
+    timer = StageTimer([s for s in STAGES if not (THREADED and s in engineStages)], csvPath=PROFILECSV)
+    if PROFILE : timer.toggle()
+    renderer.timer = timer
+    if not THREADED : life.timer = timer
     life.countNeighbors()
+    if ONCYCLE : life.watchCycles()
+    if DIRTYRECTS and not THREADED : life.watchDeltas()
+    if THREADED:
+        sim = SimThread(life)
+        sim.start()
 
-    toggler, neiTog = False, False
-    genCount, updateDelayer = 0, 0
+    toggler, neiTog, budgetTog = False, False, False
+    genCount, updateDelayer, genSteps = 0, 0, GENSTEPS
+    period = 0  # last cycle found, shown until the simulation resumes
+    recorder, recorded = None, None  # the generation last recorded
     font = pg.font.Font(None, 30)
+    statFont = pg.font.SysFont('monospace', 16)  # columns line up
     clock = pg.time.Clock()
+    redraw, overlays = True, []  # whether the whole view needs repainting, and where text went last frame
 
     # main loop
-    while True:
-        clock.tick(FPS)
-        for e in pg.event.get():
-            if e.type == pg.QUIT : return
+    quitting = False
+    while not quitting:
+        with timer.stage('tick') : clock.tick(FPS)
+        frameStart = perf_counter()
+        with timer.stage('events') : events = pg.event.get()
+        redraw |= any(e.type != pg.MOUSEMOTION for e in events)  # keys, clicks and window changes repaint everything
+        for e in events:
+            if e.type == pg.QUIT : quitting = True
             elif e.type == pg.MOUSEBUTTONDOWN:
                 mousepos = pg.mouse.get_pos()
-                if e.button == 1 : life.poke(mousepos, cSize, adjust_x, adjust_y, 1)
-                elif e.button == 3 : life.poke(mousepos, cSize, adjust_x, adjust_y, 0)
+                poke = sim.poke if THREADED else life.poke
+                if e.button == 1 : poke(mousepos, cSize, adjust_x, adjust_y, 1)
+                elif e.button == 3 : poke(mousepos, cSize, adjust_x, adjust_y, 0)
             elif e.type == pg.KEYDOWN:
-                if e.key == pg.K_q or e.key == pg.K_ESCAPE : return
-                elif e.key==pg.K_SPACE or e.key==pg.K_KP_ENTER or e.key==pg.K_RETURN : toggler = ~toggler
+                if e.key == pg.K_q or e.key == pg.K_ESCAPE : quitting = True
+                elif e.key==pg.K_SPACE or e.key==pg.K_KP_ENTER or e.key==pg.K_RETURN : toggler, period = ~toggler, 0
                 elif e.key == pg.K_KP1 or e.key == pg.K_1 : simFrame = 1
                 elif e.key == pg.K_KP2 or e.key == pg.K_2 : simFrame = 3
                 elif e.key == pg.K_KP3 or e.key == pg.K_3 : simFrame = 5
@@ -142,6 +511,21 @@ def main():
                 elif e.key == pg.K_KP9 or e.key == pg.K_9 : simFrame = 42
                 elif e.key == pg.K_KP0 or e.key == pg.K_0 or e.key == pg.K_c : colTog = ~colTog
                 elif e.key == pg.K_KP_PERIOD or e.key == pg.K_n : neiTog = ~neiTog
+                elif e.key == pg.K_PAGEUP and genSteps < 1024 : genSteps *= 2
+                elif e.key == pg.K_PAGEDOWN and genSteps > 1 : genSteps //= 2
+                elif e.key == pg.K_b : budgetTog = ~budgetTog
+                elif e.key == pg.K_F3 : timer.toggle()
+                elif e.key == pg.K_F7:
+                    if recorder : recorder.close()
+                    recorder = None if recorder else Recorder(RECORDTO, xy=True, first=genCount)  # later runs don't overwrite
+                    recorded = None
+                elif e.key == pg.K_F5 or e.key == pg.K_F9:
+                    with sim.engineLock if THREADED else nullcontext():
+                        if e.key == pg.K_F5 : saveSnapshot(SNAPFILE, life.packedGrid(), full_h, ruleString(life.lut), genCount, SNAPZIP)
+                        else: genCount = restore(life, SNAPFILE)
+                        if THREADED and e.key == pg.K_F9:
+                            sim.generation = genCount
+                            sim.publish()
                 elif (e.key == pg.K_w or e.key == pg.K_i or e.key == pg.K_UP) and adjust_y > 0:
                     adjust_y -= zoomed_h//5
                     if adjust_y < 0 : adjust_y = 0
@@ -173,32 +557,86 @@ def main():
                     adjust_x += (old_cx - centerx)
                     adjust_y += (old_cy - centery)
 
+        if toggler and life.cycles and life.cycles.period:
+            period = life.cycles.period
+            with sim.engineLock if THREADED else nullcontext():
+                if ONCYCLE == 'reseed':
+                    life.load(np.random.random((SOUPSIZE, SOUPSIZE)) < 0.35)
+                    genCount, period = 0, 0
+                    if THREADED : sim.generation = 0
+                else: toggler = False
+                life.watchCycles()  # so resuming runs at least one more period
+                if THREADED : sim.publish()
+            redraw = True
+
+        if THREADED:  # the worker runs free, these just set its pace
+            sim.gens, sim.delay, sim.colors = genSteps, (simFrame-1)/FPS, bool(colTog)
+            if toggler : sim.running.set()
+            else: sim.running.clear()
+
         zoomed_w, zoomed_h = win_w//cSize, win_h//cSize
-        outimg = pg.Surface((zoomed_w, zoomed_h)).convert()
+        viewport = (adjust_x, adjust_y, zoomed_w, zoomed_h)
+        mode = ('neighbors' if neiTog else 'color') if colTog else 'bw'
 
-        if colTog:
-            color_grid = colors[life.neighbors] if neiTog else colors[life.neighbors] * life.grid
-            pg.surfarray.blit_array(outimg, color_grid[adjust_x:adjust_x+zoomed_w, adjust_y:adjust_y+zoomed_h])
+        with timer.stage('view') : source = sim.frame() if THREADED else nullcontext(life.view(*viewport, colTog) + (genCount,))
+        with source as frame:
+            grid, neighbors, genCount = frame
+            if recorder and genCount != recorded:  # each new generation drawn, from the full map
+                recorder.add(grid if THREADED else life.grid)
+                recorded = genCount
+            if THREADED : grid, neighbors = crop(grid, *viewport), crop(neighbors, *viewport) if colTog else None
+            texts = []  # (surface, rect), rendered first so the cells under them get repainted too
+            if SHOWGEN:
+                speedtxt = '  (max)' if budgetTog else f'  (x{genSteps})' if genSteps > 1 else ''
+                cycletxt = '  still' if period == 1 else f'  period {period}' if period else ''
+                gentxt = font.render(str(genCount) + speedtxt + cycletxt, True, [100,100,100])
+                texts.append((gentxt, gentxt.get_rect(center=(win_w/2, 20))))
+            # displays the fps in the upper left corner, for debugging
+            if SHOWFPS:
+                fpstxt = font.render(str(int(clock.get_fps())), True, [0,200,0])
+                texts.append((fpstxt, fpstxt.get_rect(topleft=(8, 8))))
+            if timer.enabled:  # ms per stage over the last few seconds
+                for row, line in enumerate(timer.lines()):
+                    stattxt = statFont.render(line, True, [0,200,0], [0,0,0])
+                    texts.append((stattxt, stattxt.get_rect(topleft=(8, 36 + row*18))))
+            rects = None
+            if life.dirty is not None:
+                dirty = life.takeDirty()
+                if not redraw:
+                    rects = dirtyRects(dirty, DIRTYTILE, adjust_x, adjust_y, *grid.shape)
+                    for area in overlays + [rect for _, rect in texts]:
+                        x0, y0 = area.left//cSize, area.top//cSize
+                        x1, y1 = min(-(-area.right//cSize), grid.shape[0]), min(-(-area.bottom//cSize), grid.shape[1])
+                        if x1 > x0 and y1 > y0 : rects.append((x0, y0, x1-x0, y1-y0))
+            rescaled_img = renderer.draw(grid, neighbors, mode, (zoomed_w, zoomed_h), (zoomed_w*cSize, zoomed_h*cSize), rects)
+        if rects is None:
+            screen.fill(0)
+            screen.blit(rescaled_img, (0,0))
         else:
-            pg.surfarray.blit_array(outimg,life.grid[adjust_x:adjust_x+zoomed_w,adjust_y:adjust_y+zoomed_h]*0xFFFFFF)
+            areas = [pg.Rect(x*cSize, y*cSize, w*cSize, h*cSize) for x, y, w, h in rects]
+            for area in areas : screen.blit(rescaled_img, area, area)
+        for text, rect in texts : screen.blit(text, rect)
+        overlays = [rect for _, rect in texts]
 
-        rescaled_img = pg.transform.scale(outimg, (win_w, win_h))
-        screen.fill(0)
-        screen.blit(rescaled_img, (0,0))
-        if SHOWGEN:
-            gentxt = font.render(str(genCount), True, [100,100,100])
-            gentxt_rect = gentxt.get_rect(center=(win_w/2, 20))
-            screen.blit(gentxt, gentxt_rect)
-        # displays the fps in the upper left corner, for debugging
-        if SHOWFPS : screen.blit(font.render(str(int(clock.get_fps())), True, [0,200,0]), (8, 8))
+        with timer.stage('display'):
+            if rects is None : pg.display.update()
+            else: pg.display.update(areas)
+        redraw = False
 
-        pg.display.update()
-
-        if toggler : updateDelayer += 1
+        if toggler and not THREADED : updateDelayer += 1
         if toggler and updateDelayer>=simFrame:
-            genCount, updateDelayer = genCount+1, 0
-            life.runLife()
-            life.countNeighbors()
+            updateDelayer = 0
+            if budgetTog:  # as many generations as fit in what's left of this frame
+                deadline = frameStart + SIMBUDGET/FPS
+                while True:
+                    genCount += life.step()
+                    if perf_counter() >= deadline or (life.cycles and life.cycles.period) : break
+            else: genCount += life.step(genSteps)
+        timer.endFrame()
+
+    if THREADED : sim.stop()  # before the interpreter shuts down under it
+    if recorder : recorder.close()
+    timer.close()
 
 if __name__ == '__main__':
     main()  # by Nik
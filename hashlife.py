@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import numpy as np
+from time import perf_counter
+from rle import loadRLE
+from rules import LIFE, compileRule
+
+'''
+Hashlife, a memoized quadtree version of Conway's Game of Life, for RLE patterns
+that only get interesting after millions of generations. Identical subtrees are
+stored once, and their futures are cached, so big jumps cost very little.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+PATFILE = 'patterns/breeder1.rle'
+JUMP = 16               # each printed step advances 2**JUMP generations
+STEPS = 12              # how many jumps to run from the command line
+MAXNODES = 2000000      # node cache size that triggers garbage collection
+RULE = LIFE             # any rule without B0, births from nothing would fill the infinite plane
+
+class Node():
+    __slots__ = ('k', 'nw', 'ne', 'sw', 'se', 'pop')
+
+    def __init__(self, k, nw, ne, sw, se, pop):
+        self.k = k  # level, node covers 2**k x 2**k cells
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.pop = pop
+
+OFF = Node(0, None, None, None, None, 0)
+ON = Node(0, None, None, None, None, 1)
+
+class HashLife():
+    def __init__(self, pattern, maxNodes=MAXNODES, rule=RULE):
+        self.maxNodes = maxNodes
+        self.lut = compileRule(rule)
+        if self.lut[0, 0] : raise ValueError('Hashlife needs empty space to stay empty, B0 rules are not supported')
+        self.cache = {}  # (nw, ne, sw, se) -> Node, so equal trees are one object
+        self.memo = {}   # (node, j) -> center of node advanced 2**j generations
+        self.bounds = {}  # node -> bounding box of live cells, relative to the node
+        self.empties = [OFF]
+        self.generation = 0
+        self.origin = (0, 0)  # world coords of the root's top-left cell
+        self.root = self.fromArray(np.asarray(pattern) > 0)
+
+    def join(self, nw, ne, sw, se):
+        key = (nw, ne, sw, se)
+        node = self.cache.get(key)
+        if node is None:
+            node = Node(nw.k+1, nw, ne, sw, se, nw.pop+ne.pop+sw.pop+se.pop)
+            self.cache[key] = node
+        return node
+
+    def empty(self, k):
+        while len(self.empties) <= k:
+            e = self.empties[-1]
+            self.empties.append(self.join(e, e, e, e))
+        return self.empties[k]
+
+    def fromArray(self, cells):  # cells indexed [x, y], like LifeGrid.grid
+        k = max(3, int(np.ceil(np.log2(max(cells.shape + (1,))))))
+        padded = np.zeros((2**k, 2**k), np.bool_)
+        padded[:cells.shape[0], :cells.shape[1]] = cells
+        def build(x, y, k):
+            if k == 0 : return ON if padded[x, y] else OFF
+            h = 2**(k-1)
+            if not padded[x:x+2*h, y:y+2*h].any() : return self.empty(k)
+            return self.join(build(x, y, k-1), build(x+h, y, k-1), build(x, y+h, k-1), build(x+h, y+h, k-1))
+        return build(0, 0, k)
+
+    def toArray(self):  # returns the live area as a bool array, and its top-left world coords
+        box = self.bbox()
+        if box is None : return np.zeros((0, 0), np.bool_), self.origin
+        x0, y0 = box[0]-self.origin[0], box[1]-self.origin[1]
+        out = np.zeros((box[2]-box[0]+1, box[3]-box[1]+1), np.bool_)
+        def fill(node, x, y):
+            if node.pop == 0 : return
+            if node.k == 0:
+                out[x-x0, y-y0] = True
+                return
+            h = 2**(node.k-1)
+            fill(node.nw, x, y)
+            fill(node.ne, x+h, y)
+            fill(node.sw, x, y+h)
+            fill(node.se, x+h, y+h)
+        fill(self.root, 0, 0)
+        return out, box[:2]
+
+    def centre(self, m):  # same pattern, one level bigger, padded evenly with empty space
+        z = self.empty(m.k-1)
+        self.origin = (self.origin[0] - 2**(m.k-1), self.origin[1] - 2**(m.k-1))
+        return self.join(self.join(z, z, z, m.nw), self.join(z, z, m.ne, z),
+                         self.join(z, m.sw, z, z), self.join(m.se, z, z, z))
+
+    def life4x4(self, m):  # base case, next generation of the middle 2x2 of a 4x4
+        g = np.zeros((4, 4), np.uint8)
+        for qx, qy, q in ((0, 0, m.nw), (1, 0, m.ne), (0, 1, m.sw), (1, 1, m.se)):
+            g[2*qx, 2*qy], g[2*qx+1, 2*qy] = q.nw.pop, q.ne.pop
+            g[2*qx, 2*qy+1], g[2*qx+1, 2*qy+1] = q.sw.pop, q.se.pop
+        cells = []
+        for x, y in ((1, 1), (2, 1), (1, 2), (2, 2)):
+            total = g[x-1:x+2, y-1:y+2].sum() - g[x, y]
+            cells.append(ON if self.lut[g[x, y], total] else OFF)
+        return self.join(*cells)
+
+    def successor(self, m, j):  # center half of m, 2**j generations later (j <= k-2)
+        key = (m, j)
+        result = self.memo.get(key)
+        if result is not None : return result
+        if m.pop == 0 : result = m.nw
+        elif m.k == 2 : result = self.life4x4(m)
+        else:
+            join, nw, ne, sw, se = self.join, m.nw, m.ne, m.sw, m.se
+            c1 = self.successor(nw, j)
+            c2 = self.successor(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+            c3 = self.successor(ne, j)
+            c4 = self.successor(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+            c5 = self.successor(join(nw.se, ne.sw, sw.ne, se.nw), j)
+            c6 = self.successor(join(ne.sw, ne.se, se.nw, se.ne), j)
+            c7 = self.successor(sw, j)
+            c8 = self.successor(join(sw.ne, se.nw, sw.se, se.sw), j)
+            c9 = self.successor(se, j)
+            if j < m.k-2:  # already far enough, just stitch the centers together
+                result = join(join(c1.se, c2.sw, c4.ne, c5.nw), join(c2.se, c3.sw, c5.ne, c6.nw),
+                              join(c4.se, c5.sw, c7.ne, c8.nw), join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:  # full speed, advance the quarters again for the second half
+                result = join(self.successor(join(c1, c2, c4, c5), j), self.successor(join(c2, c3, c5, c6), j),
+                              self.successor(join(c4, c5, c7, c8), j), self.successor(join(c5, c6, c8, c9), j))
+        self.memo[key] = result
+        return result
+
+    def padded(self, m):  # True if all live cells sit in the middle quarter
+        return (m.k >= 3 and m.nw.pop == m.nw.se.se.pop and m.ne.pop == m.ne.sw.sw.pop and
+                m.sw.pop == m.sw.ne.ne.pop and m.se.pop == m.se.nw.nw.pop)
+
+    def step(self, j):  # jump ahead 2**j generations in one go
+        root = self.root
+        while root.k < j+2 or not self.padded(root) : root = self.centre(root)
+        root = self.centre(root)  # extra margin, so nothing can outrun the result
+        self.root = self.successor(root, j)
+        self.origin = (self.origin[0] + 2**(root.k-2), self.origin[1] + 2**(root.k-2))
+        self.generation += 2**j
+        if len(self.cache) > self.maxNodes : self.collect()
+
+    def advance(self, gens):  # any number of generations, as a sum of power-of-two jumps
+        j = 0
+        while gens:
+            if gens & 1 : self.step(j)
+            gens, j = gens >> 1, j+1
+
+    def collect(self):  # drop every node the current pattern no longer uses
+        live, stack = set(), [self.root] + self.empties[1:]
+        while stack:
+            node = stack.pop()
+            if node.k == 0 or node in live : continue
+            live.add(node)
+            stack.extend((node.nw, node.ne, node.sw, node.se))
+        self.cache = {(n.nw, n.ne, n.sw, n.se): n for n in live}
+        self.memo, self.bounds = {}, {}
+
+    @property
+    def population(self):
+        return self.root.pop
+
+    def bbox(self):  # (min x, min y, max x, max y) of live cells in world coords, or None
+        if self.root.pop == 0 : return None
+        x0, y0, x1, y1 = self.nodeBounds(self.root)
+        ox, oy = self.origin
+        return ox+x0, oy+y0, ox+x1, oy+y1
+
+    def nodeBounds(self, node):
+        if node.k == 0 : return 0, 0, 0, 0
+        box = self.bounds.get(node)
+        if box is None:
+            h = 2**(node.k-1)
+            parts = [(self.nodeBounds(q), dx, dy) for q, dx, dy in
+                     ((node.nw, 0, 0), (node.ne, h, 0), (node.sw, 0, h), (node.se, h, h)) if q.pop]
+            box = (min(b[0]+dx for b, dx, dy in parts), min(b[1]+dy for b, dx, dy in parts),
+                   max(b[2]+dx for b, dx, dy in parts), max(b[3]+dy for b, dx, dy in parts))
+            self.bounds[node] = box
+        return box
+
+if __name__ == '__main__':
+    life = HashLife(loadRLE(PATFILE)[0], rule=RULE)
+    print(f'{PATFILE}: population {life.population}, bbox {life.bbox()}')
+    for _ in range(STEPS):
+        start = perf_counter()
+        life.step(JUMP)
+        print(f'gen {life.generation}: population {life.population}, bbox {life.bbox()}, '
+              f'nodes {len(life.cache)}, {perf_counter()-start:.3f}s')
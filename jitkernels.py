@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import numpy as np
+try:
+    from numba import njit, prange
+except ImportError:  # everything still works, just with the NumPy versions
+    njit = None
+
+'''
+Fused step kernels for the dense outer-totalistic grids (Life, Maze, mapgen caves).
+With numba, each row is stepped in one pass over a sliding window of three rows and
+three column sums, counting neighbors and applying the rule lookup table together,
+with rows spread over cores by prange. Without numba, the same calls use NumPy.
+Edges wrap like np.roll.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+JIT = njit is not None
+NOCOUNTS = np.zeros((0, 0), np.uint8)  # stands in when the counts aren't wanted
+
+def stepGrid(grid, lut, out=None, counts=None):  # next generation of any 0/1 grid, counts get grid's
+    if out is None : out = np.zeros(grid.shape, np.bool_)
+    if JIT : stepKernel(asInts(grid), lut, out, NOCOUNTS if counts is None else counts, True)
+    else:
+        if counts is None : counts = np.zeros(grid.shape, np.uint8)
+        countNumpy(grid, counts)
+        out[:] = lut[grid.view(np.uint8) if grid.dtype == np.bool_ else grid, counts]
+    return out
+
+def countGrid(grid, counts):  # just the neighbor counts, for drawing
+    if JIT : stepKernel(asInts(grid), np.zeros((2, 9), np.bool_), NOCOUNTS, counts, False)
+    else: countNumpy(grid, counts)
+    return counts
+
+def asInts(grid):  # bools get added as numbers inside the kernel
+    return grid.view(np.uint8) if grid.dtype == np.bool_ else grid
+
+def countNumpy(grid, counts):
+    padded = np.pad((grid != 0).view(np.uint8), 1, 'wrap')
+    w, h = grid.shape
+    counts[:] = 0
+    for dx in [0, 1, 2]:
+        for dy in [0, 1, 2]:
+            if (dx, dy) != (1, 1) : np.add(counts, padded[dx:dx+w, dy:dy+h], out=counts, casting='unsafe')
+
+if JIT:
+    @njit(parallel=True, cache=True)
+    def stepKernel(grid, lut, out, counts, stepping):
+        w, h = grid.shape
+        keep = counts.shape[0] > 0
+        born, stay = 0, 0  # lut rows as bit masks, bit n set if n neighbors lead to a live cell
+        for n in range(9):
+            born |= np.int32(lut[0, n]) << n
+            stay |= np.int32(lut[1, n]) << n
+        for x in prange(w):
+            mid, up, down = grid[x], grid[(x-1) % w], grid[(x+1) % w]
+            sums = np.empty(h+2, np.int32)  # column sums of rows x-1, x, x+1, with a wrapped column each side
+            for y in range(h) : sums[y+1] = up[y] + mid[y] + down[y]
+            sums[0], sums[h+1] = sums[h], sums[1]
+            if keep:
+                for y in range(h) : counts[x, y] = sums[y] + sums[y+1] + sums[y+2] - mid[y]
+            if stepping:  # rule bits picked by shifting, no lookups, so the loop vectorizes
+                for y in range(h):
+                    n = sums[y] + sums[y+1] + sums[y+2] - mid[y]
+                    out[x, y] = ((born + (stay - born) * mid[y]) >> n) & 1
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import pygame as pg
+import numpy as np
 from csv import reader
+from rules import LIFE, compileRule
 
 '''
 A Conway's Game of Life simulation, using a dictionary class.
@@ -16,6 +18,8 @@ CSIZE = 5               # starting cell pixel size
 FPS = 60                # overall target framerate/limit
 VSYNC = True            # limit frame rate to refresh rate
 SHOWFPS = True          # show framerate debug
+BACKEND = 'array'       # 'array' for sorted numpy keys, 'dict' for the original dictionary,
+                        # 'chunks' for dense 256x256 blocks made and freed as activity moves, for big patterns
 
 class LifeGrid(dict):
     def __init__(self, *args, **kwargs):
@@ -63,6 +67,142 @@ class LifeGrid(dict):
         if alive : self[spot] = 1
         elif spot in self.keys() : del self[spot]
 
+    def coords(self):
+        if not self : return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        return np.array(list(self.keys()), np.int64).T
+
+OFFSET = 1 << 30  # keeps packed keys positive, so they sort like (x, y) and offsets add cleanly
+NEIGHBORS = np.array([(dx << 32) + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)], np.int64)
+
+class LifeArray():
+    # Same unbounded grid, but live cells are a sorted array of packed (x, y) keys,
+    # and every generation is a few vectorized passes instead of a loop per cell.
+    def __init__(self, cells=()):
+        cells = np.array(list(cells), np.int64).reshape(-1, 2)
+        self.keys = np.unique(packKeys(cells[:, 0], cells[:, 1]))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def play_game(self):
+        spread = (self.keys[:, None] + NEIGHBORS).ravel()
+        cells, counts = np.unique(spread, return_counts=True)
+        found = np.searchsorted(self.keys, cells).clip(0, max(len(self.keys)-1, 0))
+        alive = self.keys[found] == cells if len(self.keys) else np.zeros(len(cells), np.bool_)
+        self.keys = cells[(counts == 3) | ((counts == 2) & alive)]  # still sorted
+
+    def poke(self, pos, cSize, off_x, off_y, alive):
+        spot = packKeys(((pos[0]-3)//cSize)+off_x, ((pos[1]-4)//cSize)+off_y)
+        i = np.searchsorted(self.keys, spot)
+        present = i < len(self.keys) and self.keys[i] == spot
+        if alive and not present : self.keys = np.insert(self.keys, i, spot)
+        elif not alive and present : self.keys = np.delete(self.keys, i)
+
+    def coords(self):
+        return (self.keys >> 32) - OFFSET, (self.keys & 0xFFFFFFFF) - OFFSET
+
+EDGES = [((0, slice(None)), (-1, 0)), ((-1, slice(None)), (1, 0)), ((slice(None), 0), (0, -1)), ((slice(None), -1), (0, 1)),
+         ((0, 0), (-1, -1)), ((0, -1), (-1, 1)), ((-1, 0), (1, -1)), ((-1, -1), (1, 1))]  # cells and the chunk they border
+
+class LifeChunks():
+    # Unbounded too, but the plane is dense square chunks in a dict keyed by chunk coords.
+    # A chunk is only stepped if it changed last generation, or a neighbor changed along their
+    # shared edge, so still lifes and empty space cost nothing. Chunks get made when activity
+    # reaches them, and dropped as soon as they're empty, so memory follows occupied area.
+    CHUNK = 256  # chunk edge length, in cells
+    BATCH = 16   # chunks stepped per numpy pass
+
+    def __init__(self, cells=(), rule=LIFE):
+        lut = compileRule(rule)
+        if lut[0, 0] : raise ValueError(f'{rule} births in empty space, so it can\'t run unbounded')
+        born, stay = set(np.nonzero(lut[0])[0]), set(np.nonzero(lut[1])[0])
+        self.counts = (born & stay, born - stay, stay - born)  # any state, dead only, alive only
+        self.chunks, self.dirty = {}, set()
+        C = self.CHUNK
+        self.empty = np.zeros((C, C), np.bool_)
+        self.blocks = np.zeros((self.BATCH, C+2, C+2), np.uint8)  # chunks with a one cell halo
+        self.sums = np.zeros((self.BATCH, C, C), np.uint8)
+        cells = np.array(list(cells), np.int64).reshape(-1, 2)
+        for key in set(zip(*(cells // C).T.tolist())):
+            inside = np.all(cells // C == key, axis=1)
+            chunk = self.chunks[key] = np.zeros((C, C), np.bool_)
+            chunk[cells[inside, 0] % C, cells[inside, 1] % C] = True
+            self.touch(key)
+
+    def __len__(self):
+        return int(sum(np.count_nonzero(chunk) for chunk in self.chunks.values()))
+
+    def touch(self, key):  # steps the chunk and all around it next generation
+        self.dirty.update((key[0]+dx, key[1]+dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+
+    def fill(self, block, key):  # chunk plus the edge cells of its 8 neighbors, missing ones read as empty
+        x, y = key
+        get, empty = self.chunks.get, self.empty
+        block[1:-1, 1:-1] = get(key, empty)
+        block[0, 1:-1], block[-1, 1:-1] = get((x-1, y), empty)[-1], get((x+1, y), empty)[0]
+        block[1:-1, 0], block[1:-1, -1] = get((x, y-1), empty)[:, -1], get((x, y+1), empty)[:, 0]
+        block[0, 0], block[0, -1] = get((x-1, y-1), empty)[-1, -1], get((x-1, y+1), empty)[-1, 0]
+        block[-1, 0], block[-1, -1] = get((x+1, y-1), empty)[0, -1], get((x+1, y+1), empty)[0, 0]
+
+    def play_game(self):
+        C, results, dirty = self.CHUNK, [], set()
+        keys = iter(self.dirty)
+        while True:  # everything gets read before anything is written
+            batch, n = [], 0
+            for key in keys:
+                self.fill(self.blocks[n], key)
+                if key not in self.chunks and not self.blocks[n].any() : continue  # nothing nearby to be born from
+                batch.append(key)
+                n += 1
+                if n == self.BATCH : break
+            if not batch : break
+            blocks, sums = self.blocks[:n], self.sums[:n]
+            sums[:] = 0
+            for dx in [0, 1, 2]:
+                for dy in [0, 1, 2]:
+                    if (dx, dy) != (1, 1) : sums += blocks[:, dx:dx+C, dy:dy+C]
+            new = self.applyRule(blocks[:, 1:-1, 1:-1].view(np.bool_), sums)
+            for key, chunk in zip(batch, new):
+                changed = chunk != self.chunks.get(key, self.empty)
+                if not changed.any() : continue
+                results.append((key, chunk.copy()))
+                dirty.add(key)
+                for edge, (dx, dy) in EDGES:  # neighbors only need stepping if cells next to them changed
+                    if changed[edge].any() : dirty.add((key[0]+dx, key[1]+dy))
+        for key, chunk in results:
+            if chunk.any() : self.chunks[key] = chunk
+            else: del self.chunks[key]  # freed as soon as it's empty
+        self.dirty = dirty
+
+    def applyRule(self, state, sums):  # comparing against the rule's counts is far quicker than indexing a lut
+        both, dead, alive = self.counts
+        new = np.zeros(sums.shape, np.bool_)
+        for n in both : new |= sums == n
+        for n in dead : new |= ~state & (sums == n)
+        for n in alive : new |= state & (sums == n)
+        return new
+
+    def poke(self, pos, cSize, off_x, off_y, alive):
+        x, y = ((pos[0]-3)//cSize)+off_x, ((pos[1]-4)//cSize)+off_y
+        key = x // self.CHUNK, y // self.CHUNK
+        if key not in self.chunks:
+            if not alive : return
+            self.chunks[key] = np.zeros((self.CHUNK, self.CHUNK), np.bool_)
+        self.chunks[key][x % self.CHUNK, y % self.CHUNK] = alive
+        if not self.chunks[key].any() : del self.chunks[key]
+        self.touch(key)
+
+    def coords(self):
+        if not self.chunks : return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        parts = [np.nonzero(chunk) + np.array(key, np.int64)[:, None] * self.CHUNK for key, chunk in self.chunks.items()]
+        xs, ys = np.concatenate(parts, axis=1)
+        return xs, ys
+
+BACKENDS = {'array': LifeArray, 'dict': LifeGrid, 'chunks': LifeChunks}
+
+def packKeys(x, y):
+    return ((np.asarray(x, np.int64) + OFFSET) << 32) | (np.asarray(y, np.int64) + OFFSET)
+
 def main():
     pg.init()  # prepare window
     pg.display.set_caption("Life")
@@ -79,15 +219,16 @@ def main():
     centerx, centery = scaled_x//2, scaled_y//2
     adjust_x, adjust_y = 0, 0
 
+    Backend = BACKENDS[BACKEND]
     patdict = {}
     try:
         with open('old/symfiller') as patfile:
             pattern = reader(patfile)
             for px, py in pattern:
                 patdict[centerx+int(px), centery+int(py)] = 1
-        lifeLayer = LifeGrid(patdict)
+        lifeLayer = Backend(patdict)
     except:
-        lifeLayer = LifeGrid({(centerx,centery):1,(centerx,centery+1):1,  # R-pentomino
+        lifeLayer = Backend({(centerx,centery):1,(centerx,centery+1):1,  # R-pentomino
         (centerx,centery+2):1,(centerx+1,centery):1,(centerx-1,centery+1):1})
     ''' lifeLayer = LifeGrid({(centerx+0, centery+0): 1, (centerx-1, centery+0): 1,  # Lidka
         (centerx-1, centery+1): 1, (centerx-2, centery+2): 1, (centerx-3, centery+2): 1,
@@ -149,13 +290,11 @@ def main():
             genCount, updateDelayer = genCount+1, 0
             lifeLayer.play_game()
 
-        pixel_array = pg.PixelArray(out_image)
-
-        for x, y in lifeLayer.keys():
-            visible_x = (0 + adjust_x) < x < (scaled_x + adjust_x)
-            visible_y = (0 + adjust_y) < y < (scaled_y + adjust_y)
-            if visible_x and visible_y:
-                pixel_array[x - adjust_x, y - adjust_y] = (100,242,200)
+        pixel_array = pg.surfarray.pixels2d(out_image)
+        xs, ys = lifeLayer.coords()
+        visible = (adjust_x < xs) & (xs < scaled_x + adjust_x) & (adjust_y < ys) & (ys < scaled_y + adjust_y)
+        pixel_array[xs[visible] - adjust_x, ys[visible] - adjust_y] = out_image.map_rgb((100,242,200))
+        del pixel_array  # unlocks the surface
 
         screen.fill(0)
         rescaled_img = pg.transform.scale(out_image, (cur_w, cur_h))
@@ -4,26 +4,49 @@ from time import sleep
 #from colorsys import hsv_to_rgb
 #from scipy.ndimage import convolve
 import os
+import shutil
+from rules import CAVE, compileRangeRule, applyRule
+from termrender import TermRenderer
+from jitkernels import stepGrid
+from boxsum import BoxCounter
 if os.name == 'nt': import msvcrt # for Windows keyboard input
 else: import sys, termios, tty, select # for Linux keyboard input
 # by Nik Stromberg nikorasu85@gmail.com Copyright (c) 2024
-sim_size = (os.get_terminal_size().lines, os.get_terminal_size().columns)
+sim_size = None  # (rows, columns), the terminal's size when left as None
 density = 0.58
 cycles = 12
+rule = CAVE  # B5678/S5678, cells with more than 4 wall neighbors become wall, or wider like CAVE2 = 'R2 >12'
+fused = False  # one pass per iteration with the jitkernels.py kernel, compiled with numba when installed
+boxed = False  # count with summed-area tables and solid walls past the edges, always on for radius 2 and up
+BATCH = 256  # maps smoothed together per pass by generateMaps, bounds memory for big batches
 
 class CellularAutomata:
 
-    def __init__(self):
-        self.array = np.random.choice([True, False], size=sim_size, p=[density, 1-density])#np.zeros(sim_size, dtype=np.bool_)
+    def __init__(self, size=None, fused=fused, rule=rule, boxed=boxed):
+        self.size = size or sim_size or terminalSize()
+        self.fused = fused
+        self.radius, self.lut = compileRangeRule(rule)
+        self.array = np.random.choice([True, False], size=self.size, p=[density, 1-density])#np.zeros(sim_size, dtype=np.bool_)
         #self.array[[1, -2], :] = self.array[:, [1, -2]] = 1
         self.array[[0, -1], :] = self.array[:, [0, -1]] = 1
-        self.neighbors = np.zeros(sim_size, dtype=np.uint8)
+        self.neighbors = np.zeros(self.size, dtype=np.uint8)
+        self.next = np.zeros(self.size, dtype=np.bool_)
+        self.boxes = BoxCounter(self.size, self.radius) if boxed or self.radius > 1 else None
+        if self.boxes : self.index = np.zeros(self.size, dtype=np.intp)  # what np.take indexes with, so no conversion
 
     def iterate(self):
+        if self.boxes:  # same cost per cell at any radius, nothing allocated per iteration
+            applyCounts(self.lut, self.array, self.boxes.count(self.array), self.index, self.next)
+            self.array, self.next = self.next, self.array
+            return
+        if self.fused:
+            stepGrid(self.array, self.lut, self.next, self.neighbors)
+            self.array, self.next = self.next, self.array
+            return
         self.countNeighbors()
         #self.neighbors = convolve(self.array.astype(np.uint8), np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]]), mode='constant', cval=1) #mode='wrap')
         #If a cell has > 4 "wall" neighbors, it becomes wall. Otherwise if cell has <=4, it becomes empty floor.
-        self.array = self.neighbors > 4
+        self.array = applyRule(self.lut, self.array, self.neighbors)
         
     def countNeighbors(self):
         #p_array = np.pad(self.array, pad_width=1, mode='constant', constant_values=True)
@@ -35,20 +58,62 @@ class CellularAutomata:
                     #np.add(self.neighbors, shifted[1:-1, 1:-1], out=self.neighbors)
                     np.add(self.neighbors, shifted, out=self.neighbors)
 
+def applyCounts(lut, state, counts, index, out):  # rule applied into out, using the preallocated index buffer
+    np.multiply(state.view(np.uint8), lut.shape[1], out=index, casting='unsafe')
+    np.add(index, counts, out=index)
+    return np.take(lut, index, out=out, mode='clip')
+
+def seedMaps(seeds, size, density=density):  # (len(seeds), *size) starting maps, walls all around each
+    maps = np.empty((len(seeds), *size), np.bool_)
+    for i, seed in enumerate(seeds) : maps[i] = np.random.default_rng(seed).random(size) < density
+    maps[:, [0, -1], :] = maps[:, :, [0, -1]] = 1
+    return maps
+
+def smoothMaps(maps, cycles=cycles, rule=rule, boxed=boxed):  # runs the rule on a (maps, rows, columns) stack at once
+    radius, lut = compileRangeRule(rule)
+    boxes = BoxCounter(maps.shape, radius) if boxed or radius > 1 else None
+    counts = np.zeros(maps.shape, np.uint8)
+    index, out = np.zeros(maps.shape, np.intp), np.zeros_like(maps)
+    for _ in range(cycles):
+        if boxes : counts = boxes.count(maps)
+        else:  # wraps within each map, like CellularAutomata.countNeighbors
+            counts[:] = 0
+            for dx in [-1, 0, 1]:
+                for dy in [-1, 0, 1]:
+                    if (dx, dy) != (0, 0) : np.add(counts, np.roll(maps, (dx, dy), (1, 2)), out=counts)
+        applyCounts(lut, maps, counts, index, out)
+        maps, out = out, maps
+    return maps
+
+def generateMaps(seeds, size, density=density, cycles=cycles, rule=rule, boxed=boxed, out=None, batch=BATCH):
+    # One cave map per seed, as a (len(seeds), rows, columns) bool array, True for wall. Each map only
+    # depends on its own seed, but they're smoothed in stacks of batch maps, one NumPy pass per cycle.
+    # out='maps.npy' streams them into that file as each stack finishes (and returns it memory mapped),
+    # out='maps.npz' saves them compressed, along with their seeds.
+    seeds = list(seeds)
+    shape = (len(seeds), *size)
+    streaming = out is not None and str(out).endswith('.npy')
+    maps = np.lib.format.open_memmap(out, 'w+', np.bool_, shape) if streaming else np.empty(shape, np.bool_)
+    for start in range(0, len(seeds), batch):
+        maps[start:start+batch] = smoothMaps(seedMaps(seeds[start:start+batch], size, density), cycles, rule, boxed)
+    if streaming : maps.flush()
+    elif out is not None : np.savez_compressed(out, maps=maps, seeds=np.asarray(seeds))
+    return maps
+
+def terminalSize():  # (rows, columns), with a fallback when there's no terminal
+    term = shutil.get_terminal_size((120, 40))
+    return term.lines, term.columns
+
+renderer = None
+
 def print_state(array):
-    output = "\x1b[H"
-    for i in range(array.shape[0]):
-        row_cells = []
-        for j in range(array.shape[1]):
-            #color = [int(c*255) for c in hsv_to_rgb(array[i,j],1,1)] #/360
-            #row_cells.append(f'\x1b[48;2;{color[0]};{color[1]};{color[2]}m \x1b[0m')
-            #row_cells.append(f'\x1b[48;2;{array[i,j]*255};{array[i,j]*255};{array[i,j]*255}m \x1b[0m')
-            row_cells.append(f"\x1b[{'47' if array[i,j] else '40'}m \x1b[0m")
-        output += ''.join(row_cells) + "\n"
-    print(output[:-1], end='\r')
+    global renderer
+    if renderer is None : renderer = TermRenderer(['40', '47'])  # black floor, white wall
+    renderer.render(array.view(np.uint8))
 
 if __name__ == '__main__':
     try:
+        sim_size = sim_size or terminalSize()
         print('\n' * (sim_size[0]-1))  # preserves terminal
         print('\x1b[?25l\x1b]0;mapgen',end='\a',flush=True)
         sim_space = CellularAutomata()
@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 import pygame as pg
 import numpy as np
-import re
+from contextlib import nullcontext
+from rules import compileRule, applyRule
+from simthread import SimThread
+from render import ViewRenderer, crop
+from rle import loadRLE
+from cycles import CycleDetector, HISTORY
+from stripes import StripePool
+from jitkernels import stepGrid
 
 '''
 A Cellular Automata using Maze ruleset, using NumPy, and with RLE support!
@@ -19,16 +26,33 @@ FLLSCRN = False         # True for fullscreen, False for window
 FPS = 60                # overall target framerate/limit
 VSYNC = True            # limit frame rate to refresh rate
 SHOWFPS = True          # show framerate debug
+RULE = 'B3/S12345'      # maze rules, or B3/S1234 for mazectric
+THREADED = False        # step the simulation on a worker thread, so drawing never waits for it
+ONCYCLE = None          # once the maze stops growing: None ignores it, 'stop' pauses, 'reseed' starts a new soup
+SOUPSIZE = 64           # side length of the random soup used when reseeding
+STRIPES = 1             # more than 1 steps the map in that many stripes on a thread pool, using more cores
+JIT = False             # one fused pass per generation, compiled with numba when installed
 
 class LifeGrid():
-    def __init__(self, maxSize, pattern):
+    def __init__(self, maxSize, pattern, rule=RULE):
         self.size = maxSize
+        self.lut = compileRule(rule)
         self.grid = np.zeros(self.size, np.int16)
+        self.load(pattern)
+        self.cycles = None
+
+    def load(self, pattern):
+        self.grid[:] = 0
         cen_x = (self.size[0]//2) - (pattern.shape[0]//2)
         cen_y = (self.size[1]//2) - (pattern.shape[1]//2)
         self.grid[cen_x:cen_x+pattern.shape[0], cen_y:cen_y+pattern.shape[1]] = pattern
         self.neighbors = np.copy(self.grid)
 
+    def watchCycles(self, history=HISTORY):  # (re)starts cycle detection from the current grid
+        if self.cycles is None : self.cycles = CycleDetector(self.grid.size, history)
+        self.cycles.reset()
+        self.cycles.update(self.grid)
+
     def runLife(self):
         self.neighbors[:] = 0
         for dx in [-1, 0, 1]:
@@ -36,17 +60,15 @@ class LifeGrid():
                 if (dx, dy) != (0, 0):
                     shifted = np.roll(self.grid, (dx, dy), (0, 1))
                     np.add(self.neighbors, shifted, out=self.neighbors)
+        self.grid[:] = applyRule(self.lut, self.grid, self.neighbors)
 
-        alive = self.grid > 0
-        one = self.neighbors == 1
-        two = self.neighbors == 2
-        three = self.neighbors == 3
-        four = self.neighbors == 4
-        five = self.neighbors == 5
-        self.grid[:] = 0  # zero out the current grid
-        # lots of unnecessary copying here, but it's so elegant - Ghast's wizardry
-        self.grid[(alive & (one | two | three | four | five)) | ((~alive) & three)] = 1
-        #self.grid[(alive & (one | two | three | four)) | ((~alive) & three)] = 1  # Mazectric
+    def step(self, gens=1):  # returns generations run, fewer if the maze settled or started repeating
+        done = 0
+        while done < gens:
+            self.runLife()
+            done += 1
+            if self.cycles and self.cycles.update(self.grid) : break
+        return done
 
     def poke(self, pos, cSize, off_x, off_y, status):
         spot = ((pos[0]-2)//cSize)+off_x, ((pos[1]-4)//cSize)+off_y  # edge rounding weird
@@ -54,37 +76,28 @@ class LifeGrid():
         if spot[1]==self.size[1] : spot = spot[0],0
         self.grid[spot] = status
         self.neighbors[spot] = status
+        if self.cycles : self.watchCycles(self.cycles.history)
+
+class StripedLifeGrid(LifeGrid):
+    # Same rules, stepped in horizontal stripes with one-row halos on a thread pool.
+    def __init__(self, maxSize, pattern, rule=RULE, threads=STRIPES):
+        super().__init__(maxSize, pattern, rule)
+        self.stripes = StripePool(self.size, threads)
+        self.next = np.zeros(self.size, np.int16)
+
+    def runLife(self):
+        self.stripes.step(self.lut, self.grid, self.neighbors, self.next)
+        self.grid, self.next = self.next, self.grid
 
-def readRLE(contents):
-    data = ''
-    dline = len(contents)
-    for num, line in enumerate(contents):
-        if line.startswith('x'):
-            x,y = [int(s) for s in re.findall(r'\d+',line)][:2]
-            dline = num+1
-        if num >= dline : data += line
-    pattern = np.zeros((x,y), np.int16)
-    splitdata = [s for s in re.split("([0-9]*[^0-9])", data) if s != ""]
-    cx, cy = 0, 0
-    for sd in splitdata:
-        if sd[0].isdigit():
-            for c in range(int(sd[:-1])):
-                if sd[-1] == 'b' : pattern[cx+c,cy] = 0
-                elif sd[-1] == 'o' : pattern[cx+c,cy] = 1
-                elif sd[-1] == '$':
-                    cy += 1
-                    cx = 0
-            if sd[-1] == 'b' or sd[-1] == 'o' : cx += int(sd[:-1])
-        elif sd == '!': return pattern
-        elif sd == '$':
-            cy += 1
-            cx = 0
-        elif sd == 'b':
-            pattern[cx,cy] = 0
-            cx += 1
-        elif sd == 'o':
-            pattern[cx,cy] = 1
-            cx += 1
+class JitLifeGrid(LifeGrid):
+    # Same rules, counted and applied in one pass by the jitkernels.py kernel.
+    def __init__(self, maxSize, pattern, rule=RULE):
+        super().__init__(maxSize, pattern, rule)
+        self.next = np.zeros(self.size, np.int16)
+
+    def runLife(self):
+        stepGrid(self.grid, self.lut, self.next, self.neighbors)
+        self.grid, self.next = self.next, self.grid
 
 def main():
     pg.init()  # prepare window
@@ -104,31 +117,40 @@ def main():
     adjust_x, adjust_y = (full_w//2)-centerx, (full_h//2)-centery
 
     try:
-        with open(PATFILE) as file : contents = file.read().splitlines()
-        pattern = readRLE(contents)
+        pattern, _ = loadRLE(PATFILE)
     except:
         pattern = np.array([[0, 1, 1], [1, 1, 0], [0, 1, 0]])  # R-pentomino
 
-    life = LifeGrid((full_w,full_h), pattern)
+    engine = JitLifeGrid if JIT else StripedLifeGrid if STRIPES > 1 else LifeGrid
+    life = engine((full_w,full_h), pattern)
     colors = np.array([0, 0x999999, 0x008000, 0x0000FF, 0xFFFF00, 0xFFA500, 0xFF4500, 0xFF0000, 0xFF00FF])
+    renderer = ViewRenderer(colors)
+
+    if ONCYCLE : life.watchCycles()
+    if THREADED:
+        sim = SimThread(life)
+        sim.start()
 
     toggler = False
     genCount, updateDelayer = 0, 0
+    period = 0  # last cycle found, shown until the simulation resumes
     clock = pg.time.Clock()
     font = pg.font.Font(None, 30)  # if SHOWFPS:
 
     # main loop
-    while True:
+    quitting = False
+    while not quitting:
         clock.tick(FPS)
         for e in pg.event.get():
-            if e.type == pg.QUIT : return
+            if e.type == pg.QUIT : quitting = True
             elif e.type == pg.MOUSEBUTTONDOWN:
                 mousepos = pg.mouse.get_pos()
-                if e.button == 1 : life.poke(mousepos, cSize, adjust_x, adjust_y, 1)
-                elif e.button == 3 : life.poke(mousepos, cSize, adjust_x, adjust_y, 0)
+                poke = sim.poke if THREADED else life.poke
+                if e.button == 1 : poke(mousepos, cSize, adjust_x, adjust_y, 1)
+                elif e.button == 3 : poke(mousepos, cSize, adjust_x, adjust_y, 0)
             elif e.type == pg.KEYDOWN:
-                if e.key == pg.K_q or e.key == pg.K_ESCAPE : return
-                elif e.key==pg.K_SPACE or e.key==pg.K_KP_ENTER or e.key==pg.K_RETURN : toggler = ~toggler
+                if e.key == pg.K_q or e.key == pg.K_ESCAPE : quitting = True
+                elif e.key==pg.K_SPACE or e.key==pg.K_KP_ENTER or e.key==pg.K_RETURN : toggler, period = ~toggler, 0
                 elif e.key == pg.K_KP1 or e.key == pg.K_1 : simFrame = 1
                 elif e.key == pg.K_KP2 or e.key == pg.K_2 : simFrame = 3
                 elif e.key == pg.K_KP3 or e.key == pg.K_3 : simFrame = 5
@@ -170,31 +192,45 @@ def main():
                     adjust_x += (old_cx - centerx)
                     adjust_y += (old_cy - centery)
 
-        if toggler : updateDelayer += 1
+        if toggler and life.cycles and life.cycles.period:
+            period = life.cycles.period
+            with sim.engineLock if THREADED else nullcontext():
+                if ONCYCLE == 'reseed':
+                    life.load(np.random.randint(0, 2, (SOUPSIZE, SOUPSIZE), np.int16))
+                    genCount, period = 0, 0
+                    if THREADED : sim.generation = 0
+                else: toggler = False
+                life.watchCycles()  # so resuming runs at least one more period
+                if THREADED : sim.publish()
+
+        if THREADED:  # the worker runs free, these just set its pace
+            sim.delay, sim.colors = (simFrame-1)/FPS, bool(colorTog)
+            if toggler : sim.running.set()
+            else: sim.running.clear()
+        elif toggler : updateDelayer += 1
         if updateDelayer>=simFrame:
-            genCount, updateDelayer = genCount+1, 0
-            life.runLife()
+            genCount, updateDelayer = genCount+life.step(), 0
 
         zoomed_w, zoomed_h = win_w//cSize, win_h//cSize
-        outimg = pg.Surface((zoomed_w, zoomed_h)).convert()
+        viewport = (adjust_x, adjust_y, zoomed_w, zoomed_h)
 
-        if colorTog:
-            color_grid = colors[life.neighbors] * life.grid
-            pg.surfarray.blit_array(outimg, color_grid[adjust_x:adjust_x+zoomed_w, adjust_y:adjust_y+zoomed_h])
-        else:  # 16777215 0xFFFFFF
-            pg.surfarray.blit_array(outimg,life.grid[adjust_x:adjust_x+zoomed_w,adjust_y:adjust_y+zoomed_h]*16777215)
-
-        rescaled_img = pg.transform.scale(outimg, (win_w, win_h))
+        with sim.frame() if THREADED else nullcontext((life.grid, life.neighbors, genCount)) as frame:
+            grid, neighbors, genCount = frame
+            rescaled_img = renderer.draw(crop(grid, *viewport), crop(neighbors, *viewport),
+                                         'color' if colorTog else 'bw', (zoomed_w, zoomed_h), (win_w, win_h))
         screen.fill(0)
         screen.blit(rescaled_img, (0,0))
         if SHOWGEN:
-            gentxt = font.render(str(genCount), True, [100,100,100])
+            cycletxt = '  still' if period == 1 else f'  period {period}' if period else ''
+            gentxt = font.render(str(genCount) + cycletxt, True, [100,100,100])
             gentxt_rect = gentxt.get_rect(center=(win_w/2, 20))
             screen.blit(gentxt, gentxt_rect)
         # displays the fps in the upper left corner, for debugging
         if SHOWFPS : screen.blit(font.render(str(int(clock.get_fps())), True, [0,200,0]), (8, 8))
         pg.display.update()
 
+    if THREADED : sim.stop()  # before the interpreter shuts down under it
+
 if __name__ == '__main__':
     main()  # by Nik
     pg.quit()
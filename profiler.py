@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import csv
+import numpy as np
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+
+'''
+Named stage timers for the viewers' frame pipeline. Wrap each stage in
+`with timer.stage('name'):`, call endFrame() once per frame, and the per-frame
+totals go into rolling windows for percentile stats, and optionally a CSV file.
+While disabled, stage() hands back one shared null context, so it costs next to nothing.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+WINDOW = 240  # frames kept for the rolling stats
+NULL = nullcontext()
+
+class Stage():
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer, self.name = timer, name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, perf_counter() - self.start)
+
+class StageTimer():
+    def __init__(self, stages=(), window=WINDOW, csvPath=None):
+        self.enabled = False
+        self.order = list(stages)  # overlay and CSV column order, new stages get appended
+        self.window = window
+        self.csvPath, self.file, self.writer = csvPath, None, None
+        self.stages, self.samples, self.current = {}, {}, {}
+        self.frames = 0
+
+    def stage(self, name):  # context manager timing one stage, adds up if used several times a frame
+        if not self.enabled : return NULL
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = self.stages[name] = Stage(self, name)
+            if name not in self.order : self.order.append(name)
+        return timer
+
+    def add(self, name, seconds):
+        self.current[name] = self.current.get(name, 0) + seconds
+
+    def endFrame(self):
+        if not self.enabled : return
+        self.frames += 1
+        row = {name: 1000 * self.current.get(name, 0) for name in self.order}  # ms
+        for name, ms in row.items():
+            if name not in self.samples : self.samples[name] = deque(maxlen=self.window)
+            self.samples[name].append(ms)
+        self.current.clear()
+        if self.csvPath:
+            if self.writer is None:
+                self.file = open(self.csvPath, 'w', newline='')
+                self.writer = csv.DictWriter(self.file, ['frame'] + self.order, extrasaction='ignore')
+                self.writer.writeheader()
+            self.writer.writerow({'frame': self.frames, **{k: f'{v:.4f}' for k, v in row.items()}})
+
+    def toggle(self):  # stats restart each time it's switched on
+        self.enabled = not self.enabled
+        self.samples.clear()
+        self.current.clear()
+        if not self.enabled and self.file : self.file.flush()
+
+    def percentiles(self, name, q=(50, 95, 99)):  # ms, over the rolling window
+        samples = self.samples.get(name)
+        return np.percentile(samples, q) if samples else np.zeros(len(q))
+
+    def lines(self):  # text for an overlay, one stage per line
+        out = [f'{"stage":<15}{"p50":>7}{"p95":>7}{"p99":>7}']
+        for name in self.order:
+            if name in self.samples : out.append(f'{name:<15}' + ''.join(f'{ms:7.2f}' for ms in self.percentiles(name)))
+        return out
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file, self.writer = None, None
+
+OFF = StageTimer()  # default for anything that can be timed, never switched on
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import os
+import queue
+import struct
+import subprocess
+import threading
+import zlib
+import numpy as np
+try:
+    from PIL import Image, GifImagePlugin  # only needed for GIFs
+except ImportError:
+    Image = None
+
+'''
+Records runs straight from an engine's cells rather than the screen. Frames are arrays
+of palette indices, copied into a bounded queue and written out by a background thread,
+as an indexed-color PNG sequence (encoded here, with zlib), an animated GIF (streamed
+a frame at a time through Pillow), or raw RGB frames piped into an encoder like ffmpeg.
+The simulation only ever waits if the writer falls a whole queue behind.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+QUEUE = 32      # frames waiting for the writer, before add() blocks
+LEVEL = 1       # PNG zlib level, cell frames are mostly long runs, so fast levels do fine
+BW = [(0, 0, 0), (255, 255, 255)]
+PNGSIG = b'\x89PNG\r\n\x1a\n'
+
+class Recorder(threading.Thread):
+    def __init__(self, target, palette=BW, fps=30, scale=1, xy=False, size=QUEUE, first=0):
+        # target is a PNG name with a {} for the frame number like 'frames/life_{:06d}.png', a folder for
+        # those, a .gif file, or an encoder command list (see ffmpeg()). xy is for cells indexed [x, y],
+        # first is the number the PNGs start counting from.
+        super().__init__(daemon=True)
+        self.palette = np.zeros((max(len(palette), 2), 3), np.uint8)
+        self.palette[:len(palette)] = palette
+        self.fps, self.scale, self.xy = fps, scale, xy
+        if isinstance(target, (list, tuple)) : self.kind = 'pipe'
+        elif target.lower().endswith('.gif') : self.kind = 'gif'
+        else:
+            self.kind = 'png'
+            if not target.lower().endswith('.png') : target = os.path.join(target, 'frame_{:06d}.png')
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        if self.kind == 'gif' and Image is None : raise ValueError('GIF recording needs Pillow, or record PNG frames')
+        self.target, self.file, self.process, self.shape = target, None, None, None
+        self.queue = queue.Queue(size)
+        self.first, self.frames, self.error = first, 0, None
+        self.start()
+
+    def add(self, cells):  # cells of palette indices (or bools), copied, so the engine can carry on with them
+        if self.error : raise self.error
+        cells = np.asarray(cells)
+        if cells.dtype == np.bool_ : self.queue.put((np.packbits(cells, axis=-1), cells.shape[-1]))  # 8x less to copy
+        else: self.queue.put((np.array(cells), 0))
+
+    def close(self):  # waits for everything queued to be written
+        self.queue.put(None)
+        self.join()
+        if self.error : raise self.error
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None : break
+            if self.error : continue  # keeps draining, so add() never blocks on a dead writer
+            try:
+                self.write(self.image(frame))
+                self.frames += 1
+            except Exception as error:
+                self.error = error
+        try:
+            self.finish()
+        except Exception as error:
+            self.error = self.error or error
+
+    def image(self, frame):  # (rows, columns) uint8 palette indices
+        frame, bits = frame
+        if bits : frame = np.unpackbits(frame, axis=-1, count=bits)
+        if self.xy : frame = frame.T
+        if self.scale > 1 : frame = np.repeat(np.repeat(frame, self.scale, 0), self.scale, 1)
+        frame = np.ascontiguousarray(frame, np.uint8)
+        if self.kind != 'png':
+            if self.shape is None : self.shape = frame.shape
+            elif frame.shape != self.shape : raise ValueError(f'{self.kind} frames all need the same size')
+        return frame
+
+    def write(self, image):
+        if self.kind == 'png':
+            with open(self.target.format(self.first + self.frames), 'wb') as file : file.write(pngBytes(image, self.palette))
+        elif self.kind == 'gif' : self.writeGIF(image)
+        else:
+            if self.process is None:
+                h, w = image.shape
+                command = [str(part).format(width=w, height=h, fps=self.fps) for part in self.target]
+                self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+            self.process.stdin.write(self.palette[image].tobytes())
+
+    def writeGIF(self, image):
+        frame = Image.frombuffer('P', image.shape[::-1], image, 'raw', 'P', 0, 1)
+        frame.putpalette(self.palette[:256].tobytes())
+        if self.file is None:
+            self.file = open(self.target, 'wb')
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': 0, 'optimize': False})
+            self.file.write(b''.join(header))
+        self.file.write(b''.join(GifImagePlugin.getdata(frame, duration=1000 / self.fps)))
+
+    def finish(self):
+        if self.file:
+            self.file.write(b';')  # GIF trailer
+            self.file.close()
+        if self.process:
+            self.process.stdin.close()
+            self.process.wait()
+
+def pngBytes(image, palette):  # indexed color PNG, at the smallest bit depth the palette fits
+    h, w = image.shape
+    depth = next(d for d in (1, 2, 4, 8) if len(palette) <= 1 << d)
+    if depth == 1 : packed = np.packbits(image, axis=1)
+    elif depth < 8:
+        per = 8 // depth
+        padded = np.zeros((h, -(-w // per) * per), np.uint8)
+        padded[:, :w] = image
+        parts = padded.reshape(h, -1, per)
+        packed = np.zeros(parts.shape[:2], np.uint8)
+        for i in range(per) : packed |= parts[:, :, i] << (8 - depth*(i+1))
+    else: packed = image
+    rows = np.zeros((h, packed.shape[1]+1), np.uint8)  # each row starts with filter type 0, none
+    rows[:, 1:] = packed
+    return (PNGSIG + pngChunk(b'IHDR', struct.pack('>IIBBBBB', w, h, depth, 3, 0, 0, 0))
+            + pngChunk(b'PLTE', palette[:1 << depth].tobytes())
+            + pngChunk(b'IDAT', zlib.compress(rows.tobytes(), LEVEL)) + pngChunk(b'IEND', b''))
+
+def pngChunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def ffmpeg(path, fps=None):  # encoder command for a pipe Recorder, size and fps get filled in at the first frame
+    return ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '{width}x{height}',
+            '-r', str(fps) if fps else '{fps}', '-i', '-', '-pix_fmt', 'yuv420p', path]
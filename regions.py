@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import numpy as np
+try:
+    from scipy import ndimage  # faster labeling, and euclidean distances
+except ImportError:
+    ndimage = None
+
+'''
+Connected region tools for generated maps, like mapgen.py caves or mazegen.py mazes.
+Labels open areas (scipy.ndimage.label when installed, otherwise union-find over the
+horizontal runs of each row, in NumPy), then removes small pockets, keeps only the
+largest area, or digs corridors so everything joins up. distanceMap gives every open
+cell its distance from the nearest wall, for placing spawns away from walls.
+Masks are True where open, so for mapgen's wall arrays pass ~walls.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+def label(mask, connectivity=4):  # (labels, count), labels 1..count in order of first cell, 0 where closed
+    if connectivity not in (4, 8) : raise ValueError(f'connectivity is 4 or 8, not {connectivity!r}')
+    mask = np.asarray(mask, np.bool_)
+    if ndimage is None : return labelRuns(mask, connectivity)
+    labels, count = ndimage.label(mask, np.ones((3, 3)) if connectivity == 8 else None)
+    return labels, count
+
+def labelRuns(mask, connectivity=4):  # same as label, without scipy
+    w, h = mask.shape
+    starts = mask.copy()
+    starts[:, 1:] &= ~mask[:, :-1]
+    runs = np.cumsum(starts.ravel(), dtype=np.int32).reshape(mask.shape) - 1  # run of every open cell
+    count = int(runs[-1, -1]) + 1 if mask.size else 0
+    ups, downs = [], []
+    for dy in ([0] if connectivity == 4 else [-1, 0, 1]):  # cell (x, y) touches (x+1, y+dy)
+        top, bottom = np.s_[:-1, max(dy, 0):h+min(dy, 0)], np.s_[1:, max(-dy, 0):h-max(dy, 0)]
+        both = mask[top] & mask[bottom]
+        same = np.zeros_like(both)  # touching the same pair of runs as the cell before, so skipped
+        same[:, 1:] = both[:, :-1] & ~starts[top][:, 1:] & ~starts[bottom][:, 1:]
+        link = both & ~same
+        ups.append(runs[top][link])
+        downs.append(runs[bottom][link])
+    parent = joinRuns(count, np.concatenate(ups), np.concatenate(downs))
+    roots, ids = np.unique(parent, return_inverse=True)
+    labels = np.zeros(mask.shape, np.int32)
+    labels[mask] = ids[runs[mask]] + 1
+    return labels, len(roots)
+
+def joinRuns(count, a, b):  # union-find over run pairs, hooking roots to the smaller one and jumping pointers
+    parent = np.arange(count, dtype=np.int32)
+    while True:
+        pa, pb = parent[a], parent[b]
+        low, high = np.minimum(pa, pb), np.maximum(pa, pb)
+        apart = low != high
+        if not apart.any() : return parent
+        np.minimum.at(parent, high[apart], low[apart])
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent) : break
+            parent = jumped
+
+def regionSizes(labels, count):  # cells per label, sizes[0] counts the closed cells
+    return np.bincount(labels.ravel(), minlength=count+1)
+
+def removeSmall(mask, minSize, connectivity=4):  # closes off regions with fewer than minSize cells
+    return cleanMap(mask, minSize, None, connectivity)
+
+def keepLargest(mask, connectivity=4):  # only the biggest region stays open
+    return cleanMap(mask, 0, 'largest', connectivity)
+
+def connectRegions(mask, connectivity=4, width=1):  # digs an L shaped corridor from every region to the largest
+    return cleanMap(mask, 0, 'connect', connectivity, width)
+
+def cleanMap(mask, minSize=0, keep=None, connectivity=4, width=1):  # all of the above off one labeling
+    if keep not in (None, 'largest', 'connect') : raise ValueError(f'keep is None, largest or connect, not {keep!r}')
+    labels, count = label(mask, connectivity)
+    sizes = regionSizes(labels, count)
+    kept = sizes >= minSize
+    kept[0] = False
+    largest = sizes[1:].argmax() + 1 if count else 0
+    if keep == 'largest' : kept[1:] = np.arange(1, count+1) == largest
+    out = kept[labels]
+    if keep == 'connect' and kept.sum() > 1:
+        main = labels == largest
+        flat = labels.ravel()
+        seen = np.maximum.accumulate(flat)  # labels count up in raster order, so each first cell raises the maximum
+        firsts = np.flatnonzero(flat[1:] > seen[:-1]) + 1
+        if flat[0] : firsts = np.concatenate(([0], firsts))
+        for first in firsts:
+            if flat[first] == largest or not kept[flat[first]] : continue
+            start = np.unravel_index(first, mask.shape)
+            digCorridor(out, start, nearestCell(main, start), width)
+    return out
+
+def nearestCell(mask, spot):  # closest True cell to spot, searching outward in growing windows
+    reach = 8
+    while True:
+        x0, y0 = max(spot[0]-reach, 0), max(spot[1]-reach, 0)
+        found = np.argwhere(mask[x0:spot[0]+reach+1, y0:spot[1]+reach+1])
+        if len(found):
+            found += (x0, y0)
+            near = found[np.abs(found - spot).sum(axis=1).argmin()]
+            if abs(near - spot).sum() <= reach or reach >= max(mask.shape) : return tuple(near)  # nothing closer outside
+        elif reach >= max(mask.shape) : raise ValueError('no cell to connect to')
+        reach *= 2
+
+def digCorridor(mask, start, end, width=1):  # along x first, then along y
+    (x0, y0), (x1, y1), r = start, end, width // 2
+    mask[max(min(x0, x1)-r, 0):max(x0, x1)+width-r, max(y0-r, 0):y0+width-r] = True
+    mask[max(x1-r, 0):x1+width-r, max(min(y0, y1)-r, 0):max(y0, y1)+width-r] = True
+
+def distanceMap(mask, metric='taxicab'):  # distance from every open cell to the nearest closed one, 0 on closed cells
+    if metric == 'euclidean':
+        if ndimage is None : raise ValueError('euclidean distances need scipy, or use taxicab')
+        return ndimage.distance_transform_edt(mask).astype(np.float32)
+    if metric != 'taxicab' : raise ValueError(f'unknown metric {metric!r}, use taxicab or euclidean')
+    dist = np.where(mask, sum(mask.shape), 0).astype(np.int32)  # larger than any real distance
+    step = np.empty(dist.shape[1], np.int32)
+    for x in range(1, len(dist)):  # down, then back up, a row at a time
+        np.add(dist[x-1], 1, out=step)
+        np.minimum(dist[x], step, out=dist[x])
+    for x in range(len(dist)-2, -1, -1):
+        np.add(dist[x+1], 1, out=step)
+        np.minimum(dist[x], step, out=dist[x])
+    ramp = np.arange(dist.shape[1], dtype=np.int32)  # then along y, min(d[k] + |y-k|) as running minimums
+    ahead = np.minimum.accumulate(dist - ramp, axis=1)
+    ahead += ramp
+    dist += ramp
+    behind = np.minimum.accumulate(dist[:, ::-1], axis=1)[:, ::-1]
+    behind -= ramp
+    return np.minimum(ahead, behind, out=behind)
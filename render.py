@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import pygame as pg
+import numpy as np
+from profiler import OFF
+
+'''
+Viewport renderer for the pygame viewers. Takes grids already cropped to the view,
+maps them through a preallocated uint32 palette into reused buffers, and scales into
+a persistent surface, so per-frame cost follows window size rather than map size.
+Given dirty rects, only those parts get recolored and scaled, for mostly still maps.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+class ViewRenderer():
+    def __init__(self, colors):
+        colors = np.asarray(colors, np.uint32)
+        self.luts = {  # [cell state, neighbor count] -> pixel, flattened for np.take
+            'bw': np.repeat(np.array([0, 0xFFFFFF], np.uint32), len(colors)),
+            'color': np.concatenate([np.zeros_like(colors), colors]),
+            'neighbors': np.concatenate([colors, colors])}
+        self.counts = len(colors)
+        self.shape, self.size = None, None
+        self.timer = OFF  # StageTimer for the colors, blit and scale stages
+
+    def resize(self, shape, size):  # buffers get reallocated only when zoom or window changes
+        if shape != self.shape:
+            self.shape = shape
+            self.index = np.zeros(shape, np.uint16)
+            self.pixels = np.zeros(shape, np.uint32)
+            self.surface = pg.Surface(shape).convert()
+        if size != self.size:
+            self.size = size
+            self.target = pg.Surface(size).convert()
+
+    def draw(self, grid, neighbors, mode, shape, size, rects=None):  # shape is the zoomed view, size the window
+        self.resize(shape, size)
+        if grid.dtype == np.bool_ : grid = grid.view(np.uint8)
+        if rects is not None : return self.drawRects(grid, neighbors, mode, rects)
+        index = self.index
+        if grid.shape != shape:  # view hangs off the map edge, leave the rest black
+            self.pixels[:] = 0
+            index = np.zeros(grid.shape, np.uint16)
+        with self.timer.stage('colors'):
+            np.multiply(grid, self.counts, out=index, casting='unsafe')
+            if mode == 'bw' or neighbors is None : lut = self.luts['bw']
+            else:
+                np.add(index, neighbors, out=index, casting='unsafe')
+                lut = self.luts[mode]
+            np.take(lut, index, out=self.pixels[:grid.shape[0], :grid.shape[1]], mode='clip')
+        with self.timer.stage('blit') : pg.surfarray.blit_array(self.surface, self.pixels)
+        with self.timer.stage('scale') : return pg.transform.scale(self.surface, size, self.target)
+
+    def drawRects(self, grid, neighbors, mode, rects):  # (x, y, w, h) cell rects of the view, size a whole multiple of shape
+        cell = self.size[0] // self.shape[0]
+        lut = self.luts['bw' if mode == 'bw' or neighbors is None else mode]
+        for x, y, w, h in rects:
+            part = np.s_[x:x+w, y:y+h]
+            with self.timer.stage('colors'):
+                index = grid[part] * np.uint16(self.counts)
+                if lut is not self.luts['bw'] : index += neighbors[part]
+                np.take(lut, index, out=self.pixels[part], mode='clip')
+            with self.timer.stage('blit'):
+                pixels = pg.surfarray.pixels2d(self.surface)  # locks the surface until released
+                pixels[part] = self.pixels[part]
+                del pixels
+            with self.timer.stage('scale'):
+                pg.transform.scale(self.surface.subsurface((x, y, w, h)), (w*cell, h*cell),
+                                   self.target.subsurface((x*cell, y*cell, w*cell, h*cell)))
+        return self.target
+
+def crop(array, x, y, w, h):
+    return None if array is None else array[x:x+w, y:y+h]
+
+def dirtyRects(dirty, tile, x, y, w, h):  # view relative cell rects over the dirty tiles, runs along y merged
+    tx, ty = x // tile, y // tile
+    part = dirty[tx:-(-(x+w) // tile), ty:-(-(y+h) // tile)]
+    rects = []
+    for i in np.flatnonzero(part.any(axis=1)):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], part[i].view(np.int8), [0]))))
+        x0, x1 = max((tx+i)*tile, x), min((tx+i+1)*tile, x+w)
+        for a, b in zip(edges[::2], edges[1::2]):
+            y0, y1 = max((ty+a)*tile, y), min((ty+b)*tile, y+h)
+            rects.append((x0-x, y0-y, x1-x0, y1-y0))
+    return rects
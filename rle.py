@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import numpy as np
+import re
+from rules import LIFE
+
+'''
+Pattern I/O for the RLE format, shared by all the scripts. The decoder works on the
+raw bytes with NumPy: run counts are read off digit positions, then runs are expanded
+with np.repeat, so big files load in milliseconds. Files are read in chunks, and the
+# header lines (name, author, comments, rule) are kept. Handles multi-state patterns.
+Copyright (c) 2021  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+CHUNK = 1 << 20  # bytes of pattern data decoded per pass
+
+def loadRLE(path):  # returns (pattern, meta), pattern is a uint8 (x, y) array of cell states
+    with open(path, 'rb') as file : return parseRLE(file)
+
+def readRLE(contents):  # pattern from a list of lines, like file.read().splitlines()
+    return parseRLE(line.encode() if isinstance(line, str) else line for line in contents)[0]
+
+def parseRLE(lines):  # any iterable of byte lines, like a file opened with 'rb'
+    meta = {'comments': []}
+    lines = iter(lines)
+    for line in lines:
+        text = line.decode(errors='replace').strip()
+        if text.startswith('#'):
+            tag, value = text[1:2], text[2:].strip()
+            if tag == 'N' : meta['name'] = value
+            elif tag == 'O' : meta['author'] = value
+            elif tag == 'r' : meta['rule'] = value  # old style rule line
+            else: meta['comments'].append(value)
+        elif text.startswith('x'):  # x = 3, y = 3, rule = B3/S23
+            fields = dict((k.strip().lower(), v.strip()) for k, v in re.findall(r'(\w+)\s*=\s*([^,]+)', text))
+            meta['x'], meta['y'] = int(fields.get('x', 0)), int(fields.get('y', 0))
+            if 'rule' in fields : meta['rule'] = fields['rule']
+            break
+        elif text:  # no header, the data starts right away
+            lines = iter([line] + list(lines))
+            break
+    counts, states = decodeRuns(lines)
+    return expandRuns(counts, states, meta.get('x', 0), meta.get('y', 0)), meta
+
+def decodeRuns(lines):  # (run lengths, run states), a state of -1 is a line end
+    counts, states = [], []
+    carry, chunk, size = b'', [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK:
+            carry, done = tokenize(carry + b''.join(chunk))
+            counts.append(done[0])
+            states.append(done[1])
+            if done[2] : return np.concatenate(counts), np.concatenate(states)
+            chunk, size = [], 0
+    carry, done = tokenize(carry + b''.join(chunk) + b'!')
+    counts.append(done[0])
+    states.append(done[1])
+    return np.concatenate(counts), np.concatenate(states)
+
+def tokenize(data):  # returns (unfinished tail, (counts, states, ended)) for one chunk
+    raw = np.frombuffer(data, np.uint8)
+    raw = raw[raw > 32]  # whitespace and line breaks can split anything
+    end = np.flatnonzero(raw == ord('!'))
+    ended = len(end) > 0
+    if ended : raw = raw[:end[0]]
+    digit = (raw >= ord('0')) & (raw <= ord('9'))
+    upper = (raw >= ord('A')) & (raw <= ord('X'))
+    prefix = (raw >= ord('p')) & (raw <= ord('y'))  # pA..yX are states 25 and up
+    prefix &= np.append(upper[1:], False)
+    last = ~digit & ~prefix  # a token ends on its state character
+    if not ended and len(raw) and ord('p') <= raw[-1] <= ord('y') : last[-1] = False  # maybe a prefix, wait for more
+    stop = np.flatnonzero(last)[-1] + 1 if last.any() else 0
+    tail = raw[stop:].tobytes()
+    raw, digit, upper, prefix, last = raw[:stop], digit[:stop], upper[:stop], prefix[:stop], last[:stop]
+    token = np.cumsum(last) - last  # which token each byte belongs to
+    tokens = int(last.sum())
+    spots = np.flatnonzero(digit)
+    owner = token[spots]
+    width = np.bincount(owner, minlength=tokens)  # number of digits in each count
+    place = width[owner] - 1 - (np.arange(len(spots)) - (np.cumsum(width) - width)[owner])
+    value = np.bincount(owner, (raw[spots] - ord('0')) * 10.0**place, tokens)
+    counts = np.where(width > 0, value, 1).astype(np.int64)
+    char = raw[last]
+    states = np.where(char == ord('$'), -1, np.where(upper[last], char.astype(np.int16) - 64, 1))
+    states[(char == ord('b')) | (char == ord('.'))] = 0
+    pre = np.flatnonzero(prefix)
+    states[token[pre]] += (raw[pre].astype(np.int16) - ord('o')) * 24
+    return tail, (counts, states.astype(np.int16), ended)
+
+def expandRuns(counts, states, x=0, y=0):
+    newline = states < 0
+    row = np.cumsum(np.where(newline, counts, 0))
+    length = np.where(newline, 0, counts)
+    right = np.cumsum(length)
+    start = right - length - np.maximum.accumulate(np.where(newline, right, 0))  # column each run starts at
+    live = states > 0
+    start, length, row, states = start[live], length[live], row[live], states[live]
+    size = (max(x, int((start+length).max(initial=0))), max(y, int(row.max(initial=-1))+1))
+    pattern = np.zeros(size, np.uint8)
+    total = int(length.sum())
+    offset = np.arange(total) - np.repeat(np.cumsum(length) - length, length)  # position within each run
+    pattern[np.repeat(start, length) + offset, np.repeat(row, length)] = np.repeat(states, length)
+    return pattern
+
+def encodeRLE(pattern, rule=LIFE, comments=(), name=None):  # RLE text for an (x, y) array of states
+    cells = np.asarray(pattern).T  # file lines run along x
+    multi = cells.max(initial=0) > 1
+    head = [f'#N {name}'] if name else []
+    head += [f'#C {c}' for c in comments]
+    head.append(f'x = {cells.shape[1]}, y = {cells.shape[0]}, rule = {rule}')
+    items, newlines = [], 0
+    for line in cells:
+        filled = np.flatnonzero(line)
+        if len(filled):
+            if newlines : items.append(run(newlines, '$'))
+            line = line[:filled[-1]+1]
+            starts = np.flatnonzero(np.diff(line, prepend=-1))
+            lengths = np.diff(starts, append=len(line))
+            items.extend(run(n, stateTag(s, multi)) for s, n in zip(line[starts].tolist(), lengths.tolist()))
+            newlines = 0
+        newlines += 1
+    items.append('!')
+    body = ['']
+    for item in items:  # lines stay under 70 characters, without splitting runs
+        if len(body[-1]) + len(item) > 70 : body.append('')
+        body[-1] += item
+    return '\n'.join(head + body) + '\n'
+
+def writeRLE(path, pattern, rule=LIFE, comments=(), name=None):
+    with open(path, 'w') as file : file.write(encodeRLE(pattern, rule, comments, name))
+
+def run(n, tag):
+    return f'{n}{tag}' if n > 1 else tag
+
+def stateTag(state, multi):
+    if not multi : return 'o' if state else 'b'
+    if not state : return '.'
+    high, low = divmod(state-1, 24)
+    return ('' if not high else chr(ord('o') + high)) + chr(ord('A') + low)
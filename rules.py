@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import numpy as np
+import re
+
+'''
+Outer-totalistic rules for the grid scripts. Rule strings like "B3/S23" get compiled
+into a 2x9 lookup table, indexed [cell state, neighbor count], so any rule is applied
+with a single gather over the neighbor array, instead of a chain of masks per rule.
+Wider box neighborhoods, like "R2 >12" or "R2,B13-24,S12-24", compile the same way.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+LIFE = 'B3/S23'
+MAZE = 'B3/S12345'
+MAZECTRIC = 'B3/S1234'
+CAVE = 'B5678/S5678'  # wall if more than 4 of the 8 neighbors are wall
+CAVE2 = 'R2 >12'      # the same, over the 24 cells within 2, for smoother caves
+
+def parseRule(rule):  # 'B3/S23', 'b3s23', or the older 'S/B' style '23/3', into (birth, survive) sets
+    rule = rule.strip().upper().replace(' ', '')
+    found = re.fullmatch(r'B(\d*)/?S(\d*)', rule) or re.fullmatch(r'S(\d*)/?B(\d*)', rule)
+    if found and rule.startswith('B') : birth, survive = found.groups()
+    elif found : survive, birth = found.groups()
+    elif re.fullmatch(r'\d*/\d*', rule) : survive, birth = rule.split('/')
+    else: raise ValueError(f'unrecognized rule string: {rule!r}')
+    if '9' in birth + survive : raise ValueError(f'neighbor counts only go up to 8: {rule!r}')
+    return {int(n) for n in birth}, {int(n) for n in survive}
+
+def parseRangeRule(rule):  # 'R2 >12', 'R2,B13-24,S12-24' (or /), or any parseRule string as radius 1
+    text = rule.strip().upper().replace(' ', '')
+    if not text.startswith('R') : return (1,) + parseRule(rule)
+    found = re.fullmatch(r'R(\d+)[,/]?(.*)', text)
+    if not found : raise ValueError(f'unrecognized rule string: {rule!r}')
+    radius, rest = int(found[1]), found[2]
+    most = (2*radius+1)**2 - 1  # neighbors in the box, not counting the cell itself
+    if radius < 1 : raise ValueError(f'radius has to be at least 1: {rule!r}')
+    if re.fullmatch(r'>\d+', rest) : birth = survive = set(range(int(rest[1:])+1, most+1))  # like the caves, both ways
+    else:
+        found = re.fullmatch(r'B([\d.,-]*?)[,/]?S([\d.,-]*)', rest) or re.fullmatch(r'S([\d.,-]*?)[,/]?B([\d.,-]*)', rest)
+        if not found : raise ValueError(f'unrecognized rule string: {rule!r}')
+        birth, survive = (countRanges(part, rule) for part in found.groups())
+        if rest.startswith('S') : birth, survive = survive, birth
+    if max(birth | survive, default=0) > most : raise ValueError(f'neighbor counts only go up to {most}: {rule!r}')
+    return radius, birth, survive
+
+def countRanges(text, rule):  # '3,5-7' or '5..7' into {3, 5, 6, 7}
+    counts = set()
+    for item in filter(None, text.strip(',').split(',')):
+        low, _, high = item.replace('..', '-').partition('-')
+        if not low.isdigit() or high and not high.isdigit() : raise ValueError(f'unrecognized count range {item!r} in {rule!r}')
+        counts.update(range(int(low), int(high or low)+1))
+    return counts
+
+def compileRule(rule):  # lookup table, lut[0, n] is birth with n neighbors, lut[1, n] survival
+    birth, survive = parseRule(rule) if isinstance(rule, str) else rule
+    lut = np.zeros((2, 9), np.bool_)
+    lut[0, sorted(birth)] = True
+    lut[1, sorted(survive)] = True
+    return lut
+
+def compileRangeRule(rule):  # (radius, lut), lut[state, n] for n up to (2*radius+1)**2 - 1 neighbors
+    radius, birth, survive = parseRangeRule(rule)
+    lut = np.zeros((2, (2*radius+1)**2), np.bool_)
+    lut[0, sorted(birth)] = True
+    lut[1, sorted(survive)] = True
+    return radius, lut
+
+def ruleString(lut):
+    return 'B' + ''.join(str(n) for n in np.nonzero(lut[0])[0]) + '/S' + ''.join(str(n) for n in np.nonzero(lut[1])[0])
+
+def applyRule(lut, state, neighbors):  # next generation as a bool array, state is any 0/1 array
+    if state.dtype == np.bool_ : state = state.view(np.uint8)
+    return lut[state, neighbors]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import threading
+import numpy as np
+from contextlib import contextmanager
+from time import sleep
+
+'''
+Runs a grid engine on a worker thread, for the pygame viewers. Each finished generation
+is copied into a back buffer, then swapped to the front, so the render loop always draws
+the latest complete generation, while NumPy (which releases the GIL) keeps stepping.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+class SimThread(threading.Thread):
+    def __init__(self, life):
+        super().__init__(daemon=True)
+        self.life = life  # anything with grid, neighbors, poke(), and step(gens) returning gens run
+        self.gens = 1  # generations per published frame
+        self.delay = 0.0  # seconds to wait between steps, to slow things down
+        self.colors = False  # neighbors only get copied when something draws them
+        self.generation = 0
+        self.running = threading.Event()  # set while the simulation should advance
+        self.stopped = threading.Event()
+        self.engineLock = threading.Lock()  # held while stepping or poking the engine
+        self.swapLock = threading.Lock()  # held while the front buffers are read or swapped
+        self.front = [np.copy(life.grid), np.copy(life.neighbors), 0]
+        self.back = [np.copy(life.grid), np.copy(life.neighbors), 0]
+
+    def run(self):
+        while not self.stopped.is_set():
+            if not self.running.wait(0.05) : continue
+            with self.engineLock:
+                self.generation += self.life.step(self.gens)
+                self.publish()
+            if self.delay : sleep(self.delay)
+
+    def publish(self):  # copy the engine's state to the back buffer, then make it the front
+        np.copyto(self.back[0], self.life.grid)
+        if self.colors : np.copyto(self.back[1], self.life.neighbors)
+        self.back[2] = self.generation
+        with self.swapLock : self.front, self.back = self.back, self.front
+
+    @contextmanager
+    def frame(self):  # yields (grid, neighbors, generation), the worker won't swap until done
+        with self.swapLock : yield tuple(self.front)
+
+    def poke(self, *args):
+        with self.engineLock:
+            self.life.poke(*args)
+            self.publish()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
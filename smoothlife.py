@@ -1,60 +1,150 @@
 #!/usr/bin/env python3
 import numpy as np
 from time import sleep
-from colorsys import hsv_to_rgb
 from scipy.ndimage import convolve
+from scipy.fft import rfft2, irfft2
+from termrender import TermRenderer, huePalette
+from cycles import CycleDetector
+from recorder import Recorder
 import os
+import shutil
 if os.name == 'nt': import msvcrt # for Windows keyboard input
 else: import sys, termios, tty, select # for Linux keyboard input
 # by Nik Stromberg nikorasu85@gmail.com Copyright (c) 2024
-sim_size = (os.get_terminal_size().lines, os.get_terminal_size().columns)
+term = shutil.get_terminal_size((120, 40))  # falls back when there's no terminal, like in benchmarks
+sim_size = (term.lines, term.columns)
+HUES = 360  # live cells are colored by how full their neighborhood is
+RADIUS = 10  # 10-12 seem stable, 5 makes smoothmazes!
+FFTRADIUS = 6  # outer radius from which FFT convolution beats the direct kind
+CONTINUOUS = False  # Rafler's continuous SmoothLife, with float32 states instead of on/off
+RECORD = None  # record every generation, to a .gif or PNGs like 'frames/smooth_{:06d}.png'
+RECORDHUES = 255  # indexed frames fit 256 colors, black included
 
 class SmoothLife:
 
-    def __init__(self):
-        self.array = np.random.choice([True, False], size=sim_size , p=[.4, .6])
-        radius = 10  # 10-12 seem stable, 5 makes smoothmazes!
+    def __init__(self, size=None, radius=RADIUS):
+        self.size = size or sim_size
+        self.array = np.random.choice([True, False], size=self.size , p=[.4, .6])
         x, y = np.ogrid[-radius:radius+1, -radius:radius+1]
         dists = np.sqrt(x**2 + y**2)
         self.kouter = np.where(dists <= radius, 1, 0)
         self.kinner = np.array([[1, 1, 1], [1, 1, 1], [1, 1, 1]])
         self.kouter[radius-1:radius+2, radius-1:radius+2] -= self.kinner
+        self.renderer = TermRenderer(['40'] + huePalette(HUES))
+        self.cycles = CycleDetector(self.array.size)
+        self.cycles.update(self.array)
+        self.fft = radius >= FFTRADIUS and min(self.size) > 2*radius
+        if self.fft:  # kernel spectra only depend on grid size, so they're computed once
+            self.spectra = [rfft2(self.wrapKernel(k)) for k in (self.kouter, self.kinner)]
+            self.product = np.empty_like(self.spectra[0])
+
+    def wrapKernel(self, kernel):  # kernel spread over a grid-sized array, centered on cell (0, 0)
+        out = np.zeros(self.size, np.float32)
+        out[:kernel.shape[0], :kernel.shape[1]] = kernel
+        return np.roll(out, (-(kernel.shape[0]//2), -(kernel.shape[1]//2)), (0, 1))
+
+    def convolve(self):  # live cell counts in the outer ring, and in the inner 3x3
+        if not self.fft:
+            state = self.array.astype(np.uint16)  # uint8 would wrap past 255 neighbors
+            return convolve(state, self.kouter, mode='wrap'), convolve(state, self.kinner, mode='wrap')
+        spectrum = rfft2(self.array.astype(np.float32), workers=-1)
+        counts = []
+        for kernel in self.spectra:
+            np.multiply(spectrum, kernel, out=self.product)
+            counts.append(np.rint(irfft2(self.product, s=self.size, workers=-1)))
+        return counts
 
     def update(self):
-        prev = self.array.copy()
-        self.near = convolve(self.array.astype(np.uint8), self.kouter, mode='wrap') / np.sum(self.kouter)
-        center = convolve(self.array.astype(np.uint8), self.kinner, mode='wrap') / 9
+        self.step()
+        self.print_state()
+
+    def step(self):  # one generation, without drawing
+        outer, inner = self.convolve()
+        self.near = outer / np.sum(self.kouter)
+        center = inner / 9
         self.array[:] = 0
         rl1 = (center >= .5) & (self.near >= .26) & (self.near <= .46) #live 1, if center >= .5 and .26 <= self.near <= .46
         rl2 = (center < .5) & (self.near >= .27) & (self.near <= .36) #birth 1, if center < .5 and .27 <= self.near <= .36
         self.array[rl1 | rl2] = True
-        if (self.array == prev).all(): self.array = np.random.choice([True, False], size=sim_size, p=[.4, .6])
-        self.print_state()
+        if self.cycles.update(self.array):  # frozen or oscillating, reseed
+            self.array = np.random.choice([True, False], size=self.size, p=[.4, .6])
+            self.cycles.reset()
+            self.cycles.update(self.array)
 
     def print_state(self):
-        output = "\x1b[H"
-        for i in range(self.array.shape[0]):
-            row_cells = []
-            for j in range(self.array.shape[1]):
-                if self.array[i,j]:
-                    color = [int(c*255) for c in hsv_to_rgb(self.near[i,j],1,1)] #/360
-                    row_cells.append(f'\x1b[48;2;{color[0]};{color[1]};{color[2]}m \x1b[0m')
-                else:
-                    row_cells.append(f"\x1b[{'47' if self.array[i,j] else '40'}m \x1b[0m")
-            output += ''.join(row_cells) + "\n"
-        print(output[:-1], end='\r')
+        self.renderer.render(self.colors())
+
+    def colors(self, hues=HUES):  # palette indices, 0 for dead cells, then a hue for how full the neighborhood is
+        return np.where(self.alive(), (self.near * hues).astype(np.intp) % hues + 1, 0)
+
+    def alive(self):
+        return self.array
+
+class ContinuousSmoothLife(SmoothLife):
+    # Rafler's SmoothLife: states are float32 fill levels, inner disk and outer ring are
+    # anti-aliased, and the smooth transition function is integrated in small time steps.
+    # All work happens in preallocated buffers, so a step only allocates inside the FFTs.
+    b1, b2, d1, d2 = .278, .365, .267, .445  # birth and death intervals
+    alpha_n, alpha_m, dt = .028, .147, .1
+
+    def __init__(self, size=None, radius=RADIUS):
+        self.size = size or sim_size
+        self.array = (np.random.random(self.size) < .4).astype(np.float32)
+        inner = radius / 3
+        x, y = np.ogrid[-radius:radius+1, -radius:radius+1]
+        dists = np.sqrt(x**2 + y**2)
+        disk = np.clip(inner + .5 - dists, 0, 1)  # smooth edges keep the pattern isotropic
+        ring = np.clip(radius + .5 - dists, 0, 1) - disk
+        self.spectra = [rfft2(self.wrapKernel(k / k.sum())) for k in (ring, disk)]
+        self.product = np.empty_like(self.spectra[0])
+        self.near, self.inner, self.lo, self.hi = (np.empty(self.size, np.float32) for _ in range(4))
+        self.renderer = TermRenderer(['40'] + huePalette(HUES))
+
+    def sigmoid(self, x, a, alpha, out):  # 1 / (1 + exp(-(x - a) * 4 / alpha)), in place
+        np.subtract(x, a, out=out)
+        np.multiply(out, -4/alpha, out=out)
+        np.exp(out, out=out)
+        np.add(out, 1, out=out)
+        np.reciprocal(out, out=out)
+
+    def step(self):
+        spectrum = rfft2(self.array, workers=-1)
+        for kernel, fill in zip(self.spectra, (self.near, self.inner)):
+            np.multiply(spectrum, kernel, out=self.product)
+            fill[:] = irfft2(self.product, s=self.size, workers=-1)
+        with np.errstate(over='ignore'):  # exp overflowing to inf still gives the right 0
+            self.sigmoid(self.inner, .5, self.alpha_m, self.inner)  # how alive the inner disk is
+            np.multiply(self.inner, self.d1-self.b1, out=self.lo)  # interval edges slide from birth to death
+            np.add(self.lo, self.b1, out=self.lo)
+            np.multiply(self.inner, self.d2-self.b2, out=self.hi)
+            np.add(self.hi, self.b2, out=self.hi)
+            self.sigmoid(self.near, self.lo, self.alpha_n, self.lo)
+            self.sigmoid(self.near, self.hi, self.alpha_n, self.hi)
+        np.subtract(1, self.hi, out=self.hi)
+        np.multiply(self.lo, self.hi, out=self.lo)  # s(n, m), the target state
+        np.multiply(self.lo, 2*self.dt, out=self.lo)
+        np.subtract(self.lo, self.dt, out=self.lo)
+        np.add(self.array, self.lo, out=self.array)
+        np.clip(self.array, 0, 1, out=self.array)
+        if self.array.max() < .01 : self.array[:] = np.random.random(self.size) < .4  # died out, reseed
+
+    def alive(self):
+        return self.array > .5
 
 if __name__ == '__main__':
+    recorder = None
     try:
         print('\n' * (sim_size[0]-1))  # preserves terminal
         print('\x1b[?25l\x1b]0;SmoothLife',end='\a',flush=True)
-        sim_space = SmoothLife()
+        sim_space = ContinuousSmoothLife() if CONTINUOUS else SmoothLife()
+        recorder = Recorder(RECORD, [(0, 0, 0)] + huePalette(RECORDHUES)) if RECORD else None
         if os.name == 'posix': # if on Linux
             oldsettings = termios.tcgetattr(sys.stdin) # store old terminal settings
             tty.setcbreak(sys.stdin) # set terminal to cbreak mode (so input doesn't wait for enter)
         # Main simulation loop
         while ...:
             sim_space.update()
+            if recorder : recorder.add(sim_space.colors(RECORDHUES))
             sleep(0.05)
             if os.name == 'nt' and msvcrt.kbhit() and msvcrt.getch() in (b'\x1b',b'q'): break # ESC or q to quit
             elif os.name == 'posix' and sys.stdin in select.select([sys.stdin],[],[],0)[0] and sys.stdin.read(1) in ('\x1b','q'): break
@@ -62,3 +152,4 @@ if __name__ == '__main__':
     finally: # ensures these run even if program is interrupted, so terminal functions properly on exit
         if os.name == 'posix': termios.tcsetattr(sys.stdin, termios.TCSADRAIN, oldsettings) # restore terminal settings
         print('\x1b[?25h')
+        if recorder : recorder.close()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import json
+import zlib
+import numpy as np
+try:
+    import zstandard  # optional, faster than zlib at similar ratios
+except ImportError:
+    zstandard = None
+
+'''
+Save and restore files for grid states. A small JSON header (rule, generation, size,
+bounding box) is followed by the grid packed 64 cells to a uint64 word along y, the
+same layout BitLifeGrid steps in. Uncompressed payloads are aligned so np.memmap can
+use them as they are, compressed ones are split into row chunks so a region of a big
+map can be loaded without decompressing all of it.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+MAGIC = b'LIFESNAP'
+VERSION = 1
+ALIGN = 64          # payload starts on a multiple of this many bytes
+CHUNKROWS = 1024    # grid rows (x) per compressed chunk
+LEVEL = 3           # compression level, for zlib or zstd
+
+def saveSnapshot(path, packed, height, rule, generation=0, compress=None):  # compress is None, 'zlib' or 'zstd'
+    packed = np.ascontiguousarray(packed, '<u8')
+    header = {'version': VERSION, 'size': [packed.shape[0], height], 'words': packed.shape[1], 'rule': rule,
+              'generation': generation, 'bbox': packedBounds(packed), 'compress': compress}
+    if compress:
+        header['chunkRows'] = CHUNKROWS
+        chunks = [compressor(compress)(packed[r:r+CHUNKROWS].tobytes()) for r in range(0, packed.shape[0], CHUNKROWS)]
+        header['chunks'] = np.cumsum([0] + [len(c) for c in chunks]).tolist()  # byte offsets, one past the end last
+    text = json.dumps(header).encode()
+    start = -(-(len(MAGIC) + 4 + len(text)) // ALIGN) * ALIGN
+    with open(path, 'wb') as file:
+        file.write(MAGIC + np.uint32(len(text)).tobytes() + text)
+        file.write(b'\0' * (start - file.tell()))
+        if compress:
+            for chunk in chunks : file.write(chunk)
+        else: packed.tofile(file)
+
+def readHeader(path):  # header dict, plus 'offset' where the payload starts
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC : raise ValueError(f'{path} is not a snapshot file')
+        length = int(np.frombuffer(file.read(4), np.uint32)[0])
+        header = json.loads(file.read(length))
+    if header['version'] > VERSION : raise ValueError(f'{path} needs a newer snapshot version')
+    header['offset'] = -(-(len(MAGIC) + 4 + length) // ALIGN) * ALIGN
+    return header
+
+def openSnapshot(path):  # (packed words, header), memory mapped copy-on-write when uncompressed
+    header = readHeader(path)
+    if header['compress'] : return loadSnapshot(path)
+    shape = (header['size'][0], header['words'])
+    return np.memmap(path, '<u8', 'c', header['offset'], shape), header
+
+def loadSnapshot(path, rows=None):  # (packed words, header), rows=(start, stop) loads just that band of x
+    header = readHeader(path)
+    start, stop = rows or (0, header['size'][0])
+    if not header['compress']:
+        shape = (header['size'][0], header['words'])
+        return np.array(np.memmap(path, '<u8', 'r', header['offset'], shape)[start:stop]), header
+    step, offsets = header['chunkRows'], header['chunks']
+    first, last = start // step, -(-stop // step)
+    expand = decompressor(header['compress'])
+    with open(path, 'rb') as file:
+        file.seek(header['offset'] + offsets[first])
+        data = file.read(offsets[last] - offsets[first])
+    parts = [expand(data[offsets[c]-offsets[first]:offsets[c+1]-offsets[first]]) for c in range(first, last)]
+    packed = np.frombuffer(b''.join(parts), '<u8').reshape(-1, header['words'])
+    return packed[start-first*step:stop-first*step].copy(), header
+
+def packedBounds(packed):  # [min x, min y, max x, max y] of the live cells, or None if empty
+    rows = np.flatnonzero(packed.any(axis=1))
+    if not len(rows) : return None
+    cols = np.flatnonzero(np.unpackbits(np.bitwise_or.reduce(packed, axis=0).view(np.uint8), bitorder='little'))
+    return [int(rows[0]), int(cols[0]), int(rows[-1]), int(cols[-1])]
+
+def compressor(kind):
+    if kind == 'zlib' : return lambda data: zlib.compress(data, LEVEL)
+    if kind == 'zstd' : return zstdLib().ZstdCompressor(level=LEVEL).compress
+    raise ValueError(f'unknown compression {kind!r}, use None, zlib or zstd')
+
+def decompressor(kind):
+    if kind == 'zlib' : return zlib.decompress
+    if kind == 'zstd' : return zstdLib().ZstdDecompressor().decompress
+    raise ValueError(f'unknown compression {kind!r}, use None, zlib or zstd')
+
+def zstdLib():
+    if zstandard is None : raise ValueError('zstd snapshots need the zstandard package, or use zlib')
+    return zstandard
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from rules import applyRule
+
+'''
+Parallel stepping for the dense torus grids. The map is cut into horizontal stripes
+(bands of x), each copied with a one-row halo from the previous generation, so every
+stripe counts and applies the rule on its own, and wrapping matches np.roll exactly.
+Stripes run on a thread pool, NumPy lets go of the GIL in its loops, so they use
+separate cores without copying the grid between processes.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+THREADS = os.cpu_count() or 1
+
+class StripePool():
+    def __init__(self, shape, threads=THREADS):
+        self.shape = shape
+        count = max(1, min(threads, shape[0]))
+        edges = np.linspace(0, shape[0], count+1).astype(int)
+        self.bands = list(zip(edges[:-1], edges[1:]))
+        self.blocks = [np.zeros((b-a+2, shape[1]+2), np.uint8) for a, b in self.bands]  # stripe plus halo
+        self.pool = ThreadPoolExecutor(count, 'stripe')
+
+    def fill(self, i, grid):  # copies stripe i and its wrapped halo into its block
+        (a, b), block = self.bands[i], self.blocks[i]
+        block[1:-1, 1:-1] = grid[a:b]
+        block[0, 1:-1] = grid[a-1]  # row -1 wraps by itself
+        block[-1, 1:-1] = grid[b % self.shape[0]]
+        block[:, 0], block[:, -1] = block[:, -2], block[:, 1]
+        return block
+
+    def countBand(self, i, grid, neighbors):
+        (a, b), block = self.bands[i], self.fill(i, grid)
+        out = neighbors[a:b]
+        w = block.shape[1] - 2
+        np.add(block[:-2, :w], block[:-2, 1:w+1], out=out)
+        for dx, dy in ((0, 2), (1, 0), (1, 2), (2, 0), (2, 1), (2, 2)):
+            np.add(out, block[dx:dx+b-a, dy:dy+w], out=out)
+
+    def stepBand(self, i, lut, grid, neighbors, out):
+        a, b = self.bands[i]
+        self.countBand(i, grid, neighbors)
+        out[a:b] = applyRule(lut, grid[a:b], neighbors[a:b])
+
+    def count(self, grid, neighbors):  # neighbor counts of grid, into neighbors
+        list(self.pool.map(lambda i: self.countBand(i, grid, neighbors), range(len(self.bands))))
+
+    def step(self, lut, grid, neighbors, out):  # next generation into out, neighbors get grid's counts
+        list(self.pool.map(lambda i: self.stepBand(i, lut, grid, neighbors, out), range(len(self.bands))))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import numpy as np
+import os
+import sys
+from colorsys import hsv_to_rgb
+
+'''
+Vectorized ANSI frame encoder, for the terminal scripts. Cells are palette indices,
+each palette entry's escape code is built once, neighboring cells of the same color
+share one escape, and only the stretch of each row that changed since the last frame
+gets re-sent. Each frame goes out in a single write.
+Copyright (c) 2024  Nikolaus Stromberg  nikorasu85@gmail.com
+'''
+
+class TermRenderer():
+    def __init__(self, palette):  # list of (r, g, b) background colors, or ANSI codes like '40'
+        self.codes = [f'\x1b[{c}m' if isinstance(c, str) else '\x1b[48;2;{};{};{}m'.format(*c) for c in palette]
+        self.last = None
+
+    def render(self, cells):  # cells is a 2D array of palette indices, one per terminal character
+        cells = np.asarray(cells)
+        if self.last is None or self.last.shape != cells.shape:
+            changed = np.ones(cells.shape[0], np.bool_)
+            first, stop = np.zeros(cells.shape[0], np.intp), np.full(cells.shape[0], cells.shape[1])
+        else:
+            diff = cells != self.last
+            changed = diff.any(axis=1)
+            first = diff.argmax(axis=1)
+            stop = cells.shape[1] - diff[:, ::-1].argmax(axis=1)
+        self.last = cells.copy()
+        out = []
+        for row in np.nonzero(changed)[0]:
+            line = cells[row, first[row]:stop[row]]
+            starts = np.flatnonzero(np.diff(line, prepend=-1))  # where each run of one color begins
+            lengths = np.diff(starts, append=len(line))
+            out.append(f'\x1b[{row+1};{first[row]+1}H')
+            out.extend(self.codes[c] + ' '*n for c, n in zip(line[starts].tolist(), lengths.tolist()))
+        if out:
+            out.append('\x1b[0m')
+            data = memoryview(''.join(out).encode())
+            while data : data = data[os.write(sys.stdout.fileno(), data):]  # big frames can take a few writes
+
+    def reset(self):  # next frame gets drawn in full, like after the terminal was resized
+        self.last = None
+
+def huePalette(steps):  # fully saturated colors around the hue wheel, built once instead of per cell
+    return [tuple(int(c*255) for c in hsv_to_rgb(i/steps, 1, 1)) for i in range(steps)]